@@ -1,64 +1,1142 @@
-import customtkinter as ctk
 import requests
+from requests.adapters import HTTPAdapter
+import argparse
+import hashlib
 import json
 import time
 import os
+import random
+import re
+import socket
+import sqlite3
+import sys
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
-from threading import Thread
-from tkinter import filedialog, messagebox
-import pandas as pd
-import numpy as np
+from email.utils import parsedate_to_datetime
+from queue import Queue
+from urllib.parse import urlencode, urlsplit
+from threading import Event, Lock, Thread
 
 # Cargar variables de entorno
 from dotenv import load_dotenv
 load_dotenv()
 
+# La GUI (customtkinter) y pandas/numpy se importan solo cuando se usan, para que el modo
+# por línea de comandos arranque rápido y el módulo se pueda importar en un servidor sin pantalla.
+
 # --- CONFIGURACIÓN DE LA API DE INSTAGRAM ---
-INSTAGRAM_APP_ID = os.environ.get('INSTAGRAM_APP_ID')
-INSTAGRAM_COOKIE = os.environ.get('INSTAGRAM_COOKIE')
+# Base de la API privada; se puede apuntar a un servidor local (p. ej. benchmarks/mock_instagram.py)
+INSTAGRAM_API_BASE = os.environ.get('INSTAGRAM_API_BASE', 'https://i.instagram.com/api/v1').rstrip('/')
+
+class MissingCredentialsError(RuntimeError):
+    pass
+
+def load_credentials(environ=None):
+    """Pares (nombre, app_id, cookie) configurados en el entorno.
+
+    Además de INSTAGRAM_APP_ID/INSTAGRAM_COOKIE se leen INSTAGRAM_COOKIE_<n>, cada una con su
+    INSTAGRAM_APP_ID_<n> o, si no está, con INSTAGRAM_APP_ID.
+    """
+    environ = os.environ if environ is None else environ
+    base_app_id = environ.get('INSTAGRAM_APP_ID')
+    credentials = []
+    if base_app_id and environ.get('INSTAGRAM_COOKIE'):
+        credentials.append(("principal", base_app_id, environ['INSTAGRAM_COOKIE']))
+    numbered = sorted(int(key.rsplit('_', 1)[1]) for key in environ if re.fullmatch(r'INSTAGRAM_COOKIE_\d+', key))
+    for n in numbered:
+        app_id = environ.get(f'INSTAGRAM_APP_ID_{n}') or base_app_id
+        if app_id and environ[f'INSTAGRAM_COOKIE_{n}']:
+            credentials.append((f"cookie {n}", app_id, environ[f'INSTAGRAM_COOKIE_{n}']))
+    return credentials
+
+def check_credentials():
+    """Se llama al iniciar un análisis (no al importar el módulo)."""
+    if not load_credentials():
+        raise MissingCredentialsError(
+            "INSTAGRAM_APP_ID o INSTAGRAM_COOKIE no encontrados en el archivo .env. "
+            "Por favor, crea un archivo .env en la misma carpeta y añade tus credenciales. "
+            "Consulta la documentación para saber cómo obtener estas credenciales."
+        )
+
+# --- CONFIGURACIÓN DEL MOTOR DE SCRAPING ---
+# Número de perfiles analizados en paralelo y presupuesto global de peticiones por segundo
+MAX_WORKERS = int(os.environ.get('SCRAPER_MAX_WORKERS', 4))
+REQUESTS_PER_SECOND = float(os.environ.get('SCRAPER_REQUESTS_PER_SECOND', 2))
+# Conexiones keep-alive que la sesión HTTP mantiene abiertas por host
+POOL_SIZE = int(os.environ.get('SCRAPER_POOL_SIZE', max(10, MAX_WORKERS)))
+# Límites del ritmo adaptativo y política de reintentos ante 429/5xx/timeouts
+MIN_REQUESTS_PER_SECOND = float(os.environ.get('SCRAPER_MIN_REQUESTS_PER_SECOND', 0.2))
+MAX_REQUESTS_PER_SECOND = float(os.environ.get('SCRAPER_MAX_REQUESTS_PER_SECOND', REQUESTS_PER_SECOND * 3))
+MAX_RETRIES = int(os.environ.get('SCRAPER_MAX_RETRIES', 3))
+BACKOFF_BASE_SECONDS = float(os.environ.get('SCRAPER_BACKOFF_BASE_SECONDS', 1))
+BACKOFF_MAX_SECONDS = float(os.environ.get('SCRAPER_BACKOFF_MAX_SECONDS', 60))
+# Retry-After más largo que se acepta esperar; por encima, la petición falla sin bloquear al resto de hilos
+MAX_RETRY_AFTER_SECONDS = float(os.environ.get('SCRAPER_MAX_RETRY_AFTER_SECONDS', 300))
+# Caché local de respuestas (vacío para desactivarla), TTL por endpoint y tamaño máximo en bytes
+CACHE_DB_PATH = os.environ.get('SCRAPER_CACHE_DB', 'instagram_cache.sqlite3')
+CACHE_TTL_PROFILE_SECONDS = int(os.environ.get('SCRAPER_CACHE_TTL_PROFILE_SECONDS', 6 * 3600))
+CACHE_TTL_FEED_SECONDS = int(os.environ.get('SCRAPER_CACHE_TTL_FEED_SECONDS', 3600))
+CACHE_MAX_BYTES = int(os.environ.get('SCRAPER_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# Posts guardados por cuenta para la sincronización incremental del feed
+FEED_STORE_MAX_ITEMS = int(os.environ.get('SCRAPER_FEED_STORE_MAX_ITEMS', 500))
+# Posts pedidos por página del feed
+FEED_PAGE_SIZE = int(os.environ.get('SCRAPER_FEED_PAGE_SIZE', 50))
+# Con varias credenciales, una que encadena respuestas 429 queda en cuarentena durante este tiempo
+CREDENTIAL_QUARANTINE_SECONDS = float(os.environ.get('SCRAPER_CREDENTIAL_QUARANTINE_SECONDS', 300))
+CREDENTIAL_MAX_CONSECUTIVE_THROTTLES = int(os.environ.get('SCRAPER_CREDENTIAL_MAX_CONSECUTIVE_THROTTLES', 3))
+# Carpeta de los diarios de trabajos reanudables
+JOBS_DIR = os.environ.get('SCRAPER_JOBS_DIR', 'jobs')
+# Histórico de snapshots de cada ejecución (vacío para desactivarlo)
+HISTORY_DB_PATH = os.environ.get('SCRAPER_HISTORY_DB', 'instagram_history.sqlite3')
+# Descarga de medios: carpeta, hilos y ritmo propios, independientes del presupuesto de la API
+MEDIA_DIR = os.environ.get('SCRAPER_MEDIA_DIR', 'media')
+MEDIA_WORKERS = int(os.environ.get('SCRAPER_MEDIA_WORKERS', 4))
+MEDIA_REQUESTS_PER_SECOND = float(os.environ.get('SCRAPER_MEDIA_REQUESTS_PER_SECOND', 8))
+# Cola compartida entre procesos: duración de cada lease y leases por usuario antes de darlo por fallido
+WORK_QUEUE_LEASE_SECONDS = float(os.environ.get('SCRAPER_LEASE_SECONDS', 120))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.environ.get('SCRAPER_QUEUE_MAX_ATTEMPTS', 3))
+
+# --- INSTRUMENTACIÓN ---
+
+METRICS_PREFIX = 'instagram_scraper_'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PAGE_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+class RunMetrics:
+    """Contadores e histogramas del proceso, exportables como resumen JSON o en formato de texto de Prometheus."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def totals(self):
+        """Suma de cada contador y de cada histograma (sum) sin distinguir etiquetas; sirve para calcular deltas."""
+        totals = {}
+        with self._lock:
+            for (name, _), value in self._counters.items():
+                totals[name] = totals.get(name, 0) + value
+            for (name, _), histogram in self._histograms.items():
+                totals[name] = totals.get(name, 0) + histogram["sum"]
+        return totals
+
+    def summary(self):
+        def label_text(labels):
+            return "{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""
+
+        with self._lock:
+            counters = {f"{name}{label_text(labels)}": value for (name, labels), value in sorted(self._counters.items())}
+            histograms = {}
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                histograms[f"{name}{label_text(labels)}"] = {
+                    "count": histogram["count"],
+                    "sum": round(histogram["sum"], 6),
+                    "mean": round(histogram["sum"] / histogram["count"], 6) if histogram["count"] else 0.0,
+                    "buckets": {str(bound): count for bound, count in zip(histogram["buckets"], histogram["counts"])},
+                }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self):
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {METRICS_PREFIX}{name} counter")
+                    typed.add(name)
+                lines.append(f"{METRICS_PREFIX}{name}{label_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {METRICS_PREFIX}{name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    cumulative += count
+                    lines.append(f"{METRICS_PREFIX}{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{METRICS_PREFIX}{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{METRICS_PREFIX}{name}_sum{label_text(labels)} {histogram['sum']}")
+                lines.append(f"{METRICS_PREFIX}{name}_count{label_text(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, filepath):
+        """Guarda las métricas: Prometheus para .prom/.txt, resumen JSON en cualquier otro caso."""
+        with open(filepath, 'w', encoding='utf-8') as f:
+            if filepath.lower().endswith(('.prom', '.txt')):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=4, ensure_ascii=False)
+
+metrics = RunMetrics()
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Sirve /metrics (Prometheus) y /metrics.json en un hilo de fondo mientras dura el proceso."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = metrics.to_prometheus(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = json.dumps(metrics.summary(), ensure_ascii=False), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class AdaptiveRateLimiter:
+    """Token bucket de una credencial: acelera mientras las respuestas son sanas y frena ante 429/5xx."""
+
+    def __init__(self, rate, min_rate, max_rate, burst=1.0, increase_step=0.1, decrease_factor=0.5):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self._lock = Lock()
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, cancel_event=None):
+        """Espera un token; si cancel_event se activa durante la espera, vuelve antes sin consumirlo."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self.rate <= 0:
+                    return
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            if cancel_event is None:
+                time.sleep(wait)
+            elif cancel_event.wait(wait):
+                return
+
+    def wait_time(self):
+        """Segundos que esperaría ahora acquire(), sin consumir ningún token."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self.rate <= 0 or self._tokens >= 1:
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def on_success(self):
+        with self._lock:
+            if self.rate > 0:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Varios hilos suelen recibir el mismo 429 a la vez: se reduce el ritmo una vez por segundo
+            if self.rate > 0 and now - self._last_decrease >= 1.0:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._last_decrease = now
+            self._tokens = 0.0
+            # Retry-After pausa a todos los hilos, no solo al que recibió la respuesta
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max((retry_at - datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
 
-if not INSTAGRAM_APP_ID or not INSTAGRAM_COOKIE:
-    print("Error: INSTAGRAM_APP_ID o INSTAGRAM_COOKIE no encontrados en el archivo .env.")
-    print("Por favor, crea un archivo .env en la misma carpeta y añade tus credenciales.")
-    print("Consulta la documentación para saber cómo obtener estas credenciales.")
-    exit()
+def backoff_delay(attempt):
+    """Backoff exponencial con jitter: entre la mitad y el total de base * 2^intento."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
 
-def get_headers():
+def build_headers(app_id, cookie):
     csrf_token = ""
-    if INSTAGRAM_COOKIE:
-        for part in INSTAGRAM_COOKIE.split(';'):
+    if cookie:
+        for part in cookie.split(';'):
             if 'csrftoken=' in part:
                 csrf_token = part.split('csrftoken=')[1].strip()
                 break
 
     if not csrf_token:
-        print("Advertencia: No se pudo extraer csrftoken de la cookie.")
+        print("Advertencia: No se pudo extraer csrftoken de la cookie.", file=sys.stderr)
 
     return {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:139.0) Gecko/20100101 Firefox/139.0',
-        'x-ig-app-id': INSTAGRAM_APP_ID,
-        'Cookie': INSTAGRAM_COOKIE,
+        'x-ig-app-id': app_id,
+        'Cookie': cookie,
         'X-CSRFToken': csrf_token,
     }
 
-def fetch_user_profile(username):
-    url = f"https://i.instagram.com/api/v1/users/web_profile_info/?username={username}"
+class Credential:
+    """Un par app_id/cookie con su propio presupuesto de peticiones y su estado de salud."""
+
+    def __init__(self, name, app_id, cookie):
+        self.name = name
+        self.headers = build_headers(app_id, cookie)
+        self.limiter = AdaptiveRateLimiter(REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND, MAX_REQUESTS_PER_SECOND)
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.unauthorized = 0
+        self.quarantines = 0
+        self.consecutive_throttles = 0
+        # Un 401 invalida la cookie para el resto de la ejecución; los 429 repetidos solo la apartan un tiempo
+        self.rejected = False
+        self.quarantined_until = 0.0
+
+    def is_healthy(self, now):
+        return not self.rejected and now >= self.quarantined_until
+
+    def state(self, now):
+        if self.rejected:
+            return "rechazada (401)"
+        if now < self.quarantined_until:
+            return f"en cuarentena ({self.quarantined_until - now:.0f} s)"
+        return "activa"
+
+class RequestCancelled(requests.exceptions.RequestException):
+    """El análisis se canceló: no se envían más peticiones ni se reintentan las fallidas."""
+
+class CredentialPool:
+    """Reparte las peticiones entre credenciales: cada una va a la sana con menos espera prevista."""
+
+    def __init__(self, credentials, quarantine_seconds=CREDENTIAL_QUARANTINE_SECONDS,
+                 max_consecutive_throttles=CREDENTIAL_MAX_CONSECUTIVE_THROTTLES):
+        self.credentials = [Credential(*credential) for credential in credentials]
+        self.quarantine_seconds = quarantine_seconds
+        self.max_consecutive_throttles = max_consecutive_throttles
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.credentials)
+
+    def _expected_wait(self, credential):
+        # Espera del token bucket más la cola de peticiones ya asignadas a esa credencial
+        rate = credential.limiter.rate
+        return credential.limiter.wait_time() + (credential.in_flight / rate if rate > 0 else 0.0)
+
+    def acquire(self, cancel_event=None):
+        """Reserva una credencial y espera su turno en su limitador; hay que devolverla con release().
+
+        Con cancel_event, la espera termina en cuanto se cancela: si aún no había credencial se lanza
+        RequestCancelled y, si la había, se devuelve sin turno (el llamador comprueba la cancelación).
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                candidates = [credential for credential in self.credentials if credential.is_healthy(now)]
+                if not candidates and all(credential.rejected for credential in self.credentials):
+                    # Todas rechazadas: se usan igualmente para que el 401 llegue al llamador
+                    candidates = self.credentials
+                if candidates:
+                    credential = min(candidates, key=lambda c: (self._expected_wait(c), c.in_flight, c.requests))
+                    credential.in_flight += 1
+                    credential.requests += 1
+                    break
+                wait = min(c.quarantined_until for c in self.credentials if not c.rejected) - now
+            if cancel_event is None:
+                time.sleep(max(wait, 0.0))
+            elif cancel_event.wait(max(wait, 0.0)):
+                raise RequestCancelled("Análisis cancelado.")
+        credential.limiter.acquire(cancel_event)
+        return credential
+
+    def release(self, credential, status_code=None, retry_after=None):
+        """Devuelve la credencial y actualiza su salud con el código de la respuesta (None si no la hubo)."""
+        with self._lock:
+            credential.in_flight -= 1
+            if status_code == 401:
+                credential.unauthorized += 1
+                credential.rejected = True
+            elif status_code == 429:
+                credential.throttled += 1
+                credential.consecutive_throttles += 1
+                # Con una sola credencial no hay a quién pasar el trabajo: basta con el limitador
+                if credential.consecutive_throttles >= self.max_consecutive_throttles and len(self.credentials) > 1:
+                    credential.quarantined_until = time.monotonic() + max(self.quarantine_seconds, retry_after or 0)
+                    credential.quarantines += 1
+                    credential.consecutive_throttles = 0
+            elif status_code is not None and status_code < 500:
+                credential.consecutive_throttles = 0
+
+    def reset_health(self):
+        """Vuelve a dar por sanas todas las credenciales (rechazos y cuarentenas de una ejecución anterior)."""
+        with self._lock:
+            for credential in self.credentials:
+                credential.rejected = False
+                credential.quarantined_until = 0.0
+                credential.consecutive_throttles = 0
+
+    def has_alternative(self, credential):
+        """Hay otra credencial sana que puede atender la petición sin esperar a esta."""
+        now = time.monotonic()
+        with self._lock:
+            return any(other is not credential and other.is_healthy(now) for other in self.credentials)
+
+    def usage(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "name": credential.name,
+                "requests": credential.requests,
+                "throttled": credential.throttled,
+                "unauthorized": credential.unauthorized,
+                "quarantines": credential.quarantines,
+                "state": credential.state(now),
+                "rate": credential.limiter.rate,
+            } for credential in self.credentials]
+
+class InstagramClient:
+    """Sesión HTTP compartida (conexiones keep-alive reutilizables) sobre un pool de credenciales."""
+
+    def __init__(self, credentials, pool_size=POOL_SIZE, max_retries=MAX_RETRIES, max_retry_after=MAX_RETRY_AFTER_SECONDS):
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.configured_credentials = list(credentials)
+        self.pool = CredentialPool(self.configured_credentials)
+        self.session = requests.Session()
+        self._stats_lock = Lock()
+        self._requests_sent = 0
+        self._connections_opened = 0
+        self._retries = 0
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        # Sustituimos las clases de pool de urllib3 para contar cada conexión nueva
+        pool_classes = adapter.poolmanager.pool_classes_by_scheme
+        adapter.poolmanager.pool_classes_by_scheme = {
+            scheme: self._counting_pool_class(pool_class) for scheme, pool_class in pool_classes.items()
+        }
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _counting_pool_class(self, pool_class):
+        client = self
+
+        class CountingPool(pool_class):
+            def _new_conn(self):
+                with client._stats_lock:
+                    client._connections_opened += 1
+                return super()._new_conn()
+
+        return CountingPool
+
+    def _backoff(self, seconds, endpoint, cancel_event=None):
+        metrics.inc("backoff_seconds_total", seconds, endpoint=endpoint)
+        # Con cancel_event la espera termina en cuanto se cancela el análisis
+        if cancel_event is not None:
+            cancel_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    def get(self, url, timeout=10, endpoint="other", cancel_event=None):
+        """GET con reintentos: 429/5xx y errores de red transitorios se repiten hasta max_retries veces.
+
+        Cada intento usa la credencial sana menos cargada; un 401 se reintenta con otra si queda alguna.
+        endpoint solo etiqueta las métricas. Si cancel_event se activa, no se envía ningún intento más
+        (la petición en vuelo termina) y se lanza RequestCancelled. Un Retry-After mayor que
+        max_retry_after no se espera: se prueba otra credencial sana o se devuelve la respuesta.
+        """
+        for attempt in range(self.max_retries + 1):
+            if cancel_event is not None and cancel_event.is_set():
+                raise RequestCancelled("Análisis cancelado.")
+            if attempt:
+                with self._stats_lock:
+                    self._retries += 1
+                metrics.inc("http_retries_total", endpoint=endpoint)
+            wait_start = time.perf_counter()
+            credential = self.pool.acquire(cancel_event)
+            request_start = time.perf_counter()
+            metrics.inc("rate_limit_wait_seconds_total", request_start - wait_start, endpoint=endpoint)
+            if cancel_event is not None and cancel_event.is_set():
+                # Cancelado mientras esperaba turno en el limitador: la credencial vuelve sin usarse
+                self.pool.release(credential)
+                raise RequestCancelled("Análisis cancelado.")
+            with self._stats_lock:
+                self._requests_sent += 1
+            try:
+                # La Cookie va en cada petición: la sesión solo comparte las conexiones entre credenciales
+                response = self.session.get(url, headers=credential.headers, timeout=timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                self.pool.release(credential)
+                metrics.inc("http_requests_total", endpoint=endpoint, status="error")
+                metrics.observe("http_request_duration_seconds", time.perf_counter() - request_start, endpoint=endpoint)
+                if attempt == self.max_retries:
+                    raise
+                self._backoff(backoff_delay(attempt), endpoint, cancel_event)
+                continue
+            except Exception:
+                self.pool.release(credential)
+                raise
+
+            metrics.inc("http_requests_total", endpoint=endpoint, status=str(response.status_code))
+            metrics.observe("http_request_duration_seconds", time.perf_counter() - request_start, endpoint=endpoint)
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            too_long = retry_after is not None and retry_after > self.max_retry_after
+            if too_long:
+                # No se bloquea el limitador compartido durante horas por una cabecera desmesurada
+                metrics.inc("retry_after_exceeded_total", endpoint=endpoint)
+                retry_after = self.max_retry_after
+            self.pool.release(credential, response.status_code, retry_after)
+
+            if response.status_code == 401 and attempt < self.max_retries and self.pool.has_alternative(credential):
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                credential.limiter.on_throttle(None if too_long else retry_after)
+                if attempt == self.max_retries:
+                    return response
+                if too_long:
+                    if self.pool.has_alternative(credential):
+                        continue
+                    return response
+                # Si otra credencial está sana se reintenta con ella sin esperar a esta
+                if not self.pool.has_alternative(credential):
+                    self._backoff(retry_after if retry_after is not None else backoff_delay(attempt), endpoint, cancel_event)
+                continue
+
+            credential.limiter.on_success()
+            return response
+
+    def connection_stats(self):
+        with self._stats_lock:
+            opened = self._connections_opened
+            sent = self._requests_sent
+            retries = self._retries
+        return {"requests": sent, "opened": opened, "reused": max(sent - opened, 0), "retries": retries}
+
+    def credential_usage(self):
+        return self.pool.usage()
+
+_client = None
+_client_lock = Lock()
+
+def get_client():
+    """Cliente HTTP compartido, creado en la primera petición tras validar las credenciales."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            check_credentials()
+            _client = InstagramClient(load_credentials())
+        return _client
+
+def refresh_credentials():
+    """Prepara las credenciales para un análisis nuevo en un proceso que lanza varios (la GUI).
+
+    Se vuelve a leer el .env: si las credenciales cambiaron, el cliente se crea de nuevo en la próxima
+    petición; si no, las rechazadas o en cuarentena en el análisis anterior se vuelven a probar.
+    """
+    global _client
+    load_dotenv(override=True)
+    credentials = load_credentials()
+    with _client_lock:
+        if _client is None:
+            return
+        if _client.configured_credentials == credentials:
+            _client.pool.reset_health()
+        else:
+            _client.session.close()
+            _client = None
+
+def open_sqlite(path):
+    """Conexión SQLite compartible entre hilos (protegida por un Lock del llamador) en modo WAL."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+class ResponseCache:
+    """Caché persistente en SQLite de respuestas JSON, con TTL por endpoint y expulsión LRU por tamaño."""
+
+    def __init__(self, path, ttls, max_bytes):
+        self.enabled = bool(path)
+        self.ttls = ttls
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.path = path
+        self._lock = Lock()
+        self._conn = None
+        self._total_bytes = 0
+
+    def _connection(self):
+        # Se abre en el primer uso (con el Lock tomado) para no crear archivos al importar el módulo
+        if self._conn is None:
+            self._conn = open_sqlite(self.path)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, body TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def make_key(endpoint, params):
+        return f"{endpoint}?{urlencode(sorted(params.items()))}"
+
+    def get(self, endpoint, params):
+        if not self.enabled:
+            return None
+        key = self.make_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttls.get(endpoint, 0):
+                self.misses += 1
+                metrics.inc("cache_lookups_total", endpoint=endpoint, result="miss")
+                return None
+            with conn:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        metrics.inc("cache_lookups_total", endpoint=endpoint, result="hit")
+        return json.loads(row[0])
+
+    def put(self, endpoint, params, data):
+        if not self.enabled:
+            return
+        key = self.make_key(endpoint, params)
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        size = len(body.encode('utf-8'))
+        now = time.time()
+        with self._lock, self._connection() as conn:
+            previous = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, size, now, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Se libera hasta el 90% del límite para no expulsar en cada inserción
+        target = self.max_bytes * 0.9
+        expired_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if self._total_bytes <= target:
+                break
+            expired_keys.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", expired_keys)
+
+response_cache = ResponseCache(
+    CACHE_DB_PATH,
+    {"web_profile_info": CACHE_TTL_PROFILE_SECONDS, "feed": CACHE_TTL_FEED_SECONDS},
+    CACHE_MAX_BYTES,
+)
+
+class FeedStore:
+    """Últimos posts conocidos de cada cuenta, para paginar el feed solo hasta lo ya visto.
+
+    Cada cuenta guarda un tramo contiguo del feed, desde su post más reciente hacia atrás.
+    """
+
+    def __init__(self, path, max_items):
+        self.enabled = bool(path)
+        self.max_items = max_items
+        self.path = path
+        self._lock = Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = open_sqlite(self.path)
+            with self._conn:
+                # feed_state (versión anterior) podía guardar tramos con huecos: no se reutiliza
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS feed_window ("
+                    "user_id TEXT PRIMARY KEY, newest_pk TEXT, items TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+        return self._conn
+
+    def load(self, user_id):
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._connection().execute("SELECT newest_pk, items FROM feed_window WHERE user_id = ?", (str(user_id),)).fetchone()
+        if row is None:
+            return None
+        return {"newest_pk": row[0], "items": json.loads(row[1])}
+
+    def save(self, user_id, items):
+        if not self.enabled or not items:
+            return
+        items = items[:self.max_items]
+        with self._lock, self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO feed_window (user_id, newest_pk, items, updated_at) VALUES (?, ?, ?, ?)",
+                (str(user_id), str(items[0].get('pk')), json.dumps(items, ensure_ascii=False, separators=(',', ':')), time.time()),
+            )
+
+feed_store = FeedStore(CACHE_DB_PATH, FEED_STORE_MAX_ITEMS)
+
+def _compact_candidates(candidates):
+    return [{'url': candidate.get('url'), 'width': candidate.get('width'), 'height': candidate.get('height')}
+            for candidate in candidates or [] if candidate.get('url')]
+
+def _compact_media(item):
+    """Resoluciones disponibles de una foto o vídeo (un post o un elemento de carrusel)."""
+    media = {'pk': item.get('pk'), 'media_type': item.get('media_type'),
+             'image_versions2': {'candidates': _compact_candidates((item.get('image_versions2') or {}).get('candidates'))}}
+    if item.get('video_versions'):
+        media['video_versions'] = _compact_candidates(item['video_versions'])
+    return media
+
+def compact_feed_item(item):
+    """Reduce un item del feed a los campos que usamos, con la misma forma que la respuesta de la API.
+
+    Se conservan todas las resoluciones y los elementos de los carruseles para la descarga de medios.
+    """
+    media = _compact_media(item)
+    carousel_media = item.get('carousel_media')
+    return {
+        'pk': item.get('pk'),
+        'caption': {'text': (item.get('caption') or {}).get('text', 'No caption')},
+        'image_versions2': {'candidates': media['image_versions2']['candidates'] or [{'url': 'No media URL'}]},
+        'video_versions': media.get('video_versions'),
+        'like_count': item.get('like_count', 0),
+        'comment_count': item.get('comment_count', 0),
+        'taken_at': item.get('taken_at', 0),
+        'media_type': item.get('media_type'),
+        'carousel_media': [_compact_media(child) for child in carousel_media if child] if isinstance(carousel_media, list) else bool(carousel_media),
+        'pinned': bool(item.get('timeline_pinned_user_ids')),
+    }
+
+def post_media(item):
+    """Pares (id del medio, resoluciones) de un post: cada elemento si es un carrusel, si no el propio post.
+
+    Los vídeos se descargan en vídeo; los items guardados antes de conservar los carruseles solo
+    aportan la portada.
+    """
+    children = item.get('carousel_media')
+    media = []
+    for entry in children if isinstance(children, list) and children else [item]:
+        candidates = entry.get('video_versions') or (entry.get('image_versions2') or {}).get('candidates') or []
+        candidates = tuple(candidate for candidate in candidates if str(candidate.get('url', '')).startswith(('http://', 'https://')))
+        if candidates:
+            media.append((str(entry.get('pk') or item.get('pk')), candidates))
+    return tuple(media)
+
+def merge_feed_items(fetched_items, stored_items):
+    """Une posts nuevos y guardados sin duplicados (los recién obtenidos mandan), del más reciente al más antiguo."""
+    merged = {}
+    for item in stored_items:
+        merged[item.get('pk')] = item
+    for item in fetched_items:
+        merged[item.get('pk')] = item
+    return sorted(merged.values(), key=lambda item: item.get('taken_at') or 0, reverse=True)
+
+# --- MÉTRICAS ---
+
+MEDIA_TYPE_LABELS = ('Foto', 'Video', 'Otro')
+METRIC_QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+def _quantile(sorted_values, q):
+    """Cuantil con interpolación lineal (el criterio por defecto de numpy.quantile)."""
+    if not sorted_values:
+        return None
+    position = q * (len(sorted_values) - 1)
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    fraction = position - low
+    return float(sorted_values[low] * (1 - fraction) + sorted_values[high] * fraction)
+
+def compute_account_metrics(items, followers):
+    """Métricas de una cuenta a partir de sus posts compactados (compact_feed_item).
+
+    Devuelve valores de Python (None si no hay datos): media, cuantiles, tasa de interacción, posts por
+    semana y desglose por tipo. El formato de presentación (redondeos, '%', 'No Disponible') se aplica
+    después, en AccountRecord.to_dict. Cada cuenta se calcula al terminar su descarga en un solo
+    recorrido de sus posts, sin arrays NumPy: para una cuenta sola montarlos cuesta más que el cálculo.
+    """
+    valid = [(item['like_count'], item['comment_count'], {1: 0, 2: 1}.get(item.get('media_type'), 2), item.get('taken_at') or 0)
+             for item in items if item.get('like_count') is not None and item.get('comment_count') is not None]
+    n = len(valid)
+    likes = sorted(post[0] for post in valid)
+    comments = sorted(post[1] for post in valid)
+    likes_mean = sum(likes) / n if n else None
+    comments_mean = sum(comments) / n if n else None
+    followers = followers if isinstance(followers, (int, float)) and not isinstance(followers, bool) else 0
+    engagement = (likes_mean + comments_mean) / followers * 100 if n and followers > 0 else None
+
+    # Frecuencia: posts por semana entre el más antiguo y el más reciente de la ventana
+    dated = [post[3] for post in valid if post[3] > 0]
+    span_weeks = (max(dated) - min(dated)) / (7 * 24 * 3600) if dated else 0
+    posts_per_week = (len(dated) - 1) / span_weeks if span_weeks > 0 else None
+
+    by_type = {}
+    for like_count, comment_count, media_type, _ in valid:
+        posts, total_likes, total_comments = by_type.get(media_type, (0, 0, 0))
+        by_type[media_type] = (posts + 1, total_likes + like_count, total_comments + comment_count)
+
+    return {
+        "posts": n,
+        "likes_mean": likes_mean,
+        "comments_mean": comments_mean,
+        "likes_quantiles": {q: _quantile(likes, q) for q in METRIC_QUANTILES},
+        "comments_quantiles": {q: _quantile(comments, q) for q in METRIC_QUANTILES},
+        "engagement_rate": engagement,
+        "posts_per_week": posts_per_week,
+        "by_media_type": {
+            label: {"posts": by_type[t][0], "likes_mean": by_type[t][1] / by_type[t][0],
+                    "comments_mean": by_type[t][2] / by_type[t][0]}
+            for t, label in enumerate(MEDIA_TYPE_LABELS) if t in by_type
+        },
+    }
+
+# --- REGISTROS DE CUENTAS Y POSTS ---
+# Los datos se guardan con tipos nativos (None = no disponible); las etiquetas en español y los
+# textos 'No Disponible', 'Sí'/'No' o '%' solo se aplican al exportar o mostrar (to_dict).
+
+NOT_AVAILABLE = 'No Disponible'
+
+def _label(value):
+    if value is None:
+        return NOT_AVAILABLE
+    if isinstance(value, bool):
+        return 'Sí' if value else 'No'
+    return value
+
+def _label_number(value):
+    return round(value, 2) if value is not None else NOT_AVAILABLE
+
+def _has_links(text):
+    return bool(text) and ('http://' in text or 'https://' in text)
+
+@dataclass(slots=True)
+class PostRecord:
+    pk: int
+    media_type: int
+    likes: int
+    comments: int
+    caption: str
+    taken_at: int
+    media_url: str
+    is_carousel: bool
+    # Medios descargables (ver post_media); no se exportan ni se guardan en los diarios
+    media: tuple = ()
+
+    @classmethod
+    def from_item(cls, item):
+        caption = (item.get('caption') or {}).get('text')
+        candidates = (item.get('image_versions2') or {}).get('candidates') or [{}]
+        return cls(
+            pk=item.get('pk'),
+            media_type=item.get('media_type'),
+            likes=item.get('like_count', 0),
+            comments=item.get('comment_count', 0),
+            caption=caption[:70] + '...' if caption and len(caption) > 70 else caption,
+            taken_at=item.get('taken_at') or None,
+            media_url=candidates[0].get('url'),
+            is_carousel=bool(item.get('carousel_media')),
+            media=post_media(item),
+        )
+
+    def to_dict(self):
+        return {
+            "PostId": self.pk,
+            "Type": 'Foto' if self.media_type == 1 else ('Video' if self.media_type == 2 else 'Otro'),
+            "Likes": self.likes,
+            "Comments": self.comments,
+            "Caption": self.caption if self.caption is not None else 'No caption',
+            "PostDate": datetime.fromtimestamp(self.taken_at).strftime('%d/%m/%Y') if self.taken_at else 'N/A',
+            "MediaUrl": self.media_url if self.media_url is not None else 'No media URL',
+            "EsCarrusel": 'Sí' if self.is_carousel else 'No',
+            "TakenAt": self.taken_at,
+        }
+
+    def to_raw(self):
+        return [self.pk, self.media_type, self.likes, self.comments, self.caption, self.taken_at, self.media_url, self.is_carousel]
+
+    @classmethod
+    def from_raw(cls, raw):
+        return cls(*raw)
+
+@dataclass(slots=True)
+class AccountRecord:
+    username: str
+    full_name: str = None
+    biography: str = None
+    country: object = None
+    category: str = None
+    followers: int = None
+    following: int = None
+    media_count: int = None
+    is_verified: bool = None
+    is_business: bool = None
+    has_highlights: bool = None
+    external_url: str = None
+    public_email: str = None
+    public_phone: str = None
+    has_public_contact: bool = None
+    bio_has_links: bool = None
+    is_private: bool = None
+    posts_for_average: int = 0
+    avg_likes: float = None
+    avg_comments: float = None
+    engagement_rate: float = None
+    likes_median: float = None
+    comments_median: float = None
+    likes_p90: float = None
+    posts_per_week: float = None
+    by_media_type: dict = field(default_factory=dict)
+    posts: list = field(default_factory=list)
+    profile_error: str = None
+    media_error: str = None
+
+    @classmethod
+    def from_profile(cls, user_data, username=None):
+        """Campos de perfil a partir de la respuesta de web_profile_info."""
+        biography = user_data.get('biography')
+        public_email = user_data.get('public_email') or None
+        public_phone = user_data.get('public_phone_number') or None
+        return cls(
+            username=username or user_data.get('username'),
+            full_name=user_data.get('full_name'),
+            biography=biography,
+            country=user_data.get('country_block'),
+            category=user_data.get('category_name'),
+            followers=(user_data.get('edge_followed_by') or {}).get('count'),
+            following=(user_data.get('edge_follow') or {}).get('count'),
+            media_count=(user_data.get('edge_owner_to_timeline_media') or {}).get('count'),
+            is_verified=bool(user_data.get('is_verified')),
+            is_business=bool(user_data.get('is_business_account')),
+            has_highlights=(user_data.get('highlight_reel_count') or 0) > 0,
+            external_url=user_data.get('external_url') or None,
+            public_email=public_email,
+            public_phone=public_phone,
+            has_public_contact=bool(public_email or public_phone),
+            bio_has_links=_has_links(biography),
+            is_private=bool(user_data.get('is_private')),
+        )
+
+    @classmethod
+    def placeholder(cls, username, profile=None, profile_error=None, media_error=None):
+        """Único constructor de cuentas incompletas: sin perfil, o con perfil pero sin medios."""
+        record = cls.from_profile(profile, username) if profile else cls(username=username)
+        record.profile_error = profile_error
+        record.media_error = media_error
+        return record
+
+    def apply_metrics(self, metrics):
+        self.posts_for_average = metrics["posts"]
+        self.avg_likes = metrics["likes_mean"]
+        self.avg_comments = metrics["comments_mean"]
+        self.engagement_rate = metrics["engagement_rate"]
+        self.likes_median = metrics["likes_quantiles"][0.5]
+        self.comments_median = metrics["comments_quantiles"][0.5]
+        self.likes_p90 = metrics["likes_quantiles"][0.9]
+        self.posts_per_week = metrics["posts_per_week"]
+        self.by_media_type = metrics["by_media_type"]
+
+    def to_dict(self):
+        """Diccionario con las etiquetas de la GUI y las exportaciones JSON/Excel."""
+        engagement = _label_number(self.engagement_rate)
+        data = {
+            "Nombre de usuario": self.username,
+            "Nombre completo": _label(self.full_name),
+            "Biografía": _label(self.biography),
+            "País": _label(self.country),
+            "URL Perfil": f"https://www.instagram.com/{self.username}",
+            "Categoría": _label(self.category),
+            "cantidad seguidores": _label(self.followers),
+            "cantidad seguidos": _label(self.following),
+            "cantidad de publicaciones": _label(self.media_count),
+            "Está verificado ✅": _label(self.is_verified),
+            "¿Es una cuenta profesional?": _label(self.is_business),
+            "Tiene Historias Destacadas": _label(self.has_highlights),
+            "URL Externa (Bio)": _label(self.external_url),
+            "Email Público": _label(self.public_email),
+            "Teléfono Público": _label(self.public_phone),
+            "Tiene Contacto Público": _label(self.has_public_contact),
+            "Biografía con Links": _label(self.bio_has_links),
+            "Es Cuenta Privada": _label(self.is_private),
+            # Guardar la cantidad de posts usados para el promedio en los datos para mostrarlo en la GUI
+            "Posts para promedio": self.posts_for_average,
+            "Me gusta promedio 👍": _label_number(self.avg_likes),
+            "Comentarios promedio 💬": _label_number(self.avg_comments),
+            "Tasa de interacción 📊": f"{engagement}%" if engagement != NOT_AVAILABLE else engagement,
+            "Me gusta mediana": _label_number(self.likes_median),
+            "Comentarios mediana": _label_number(self.comments_median),
+            "Me gusta p90": _label_number(self.likes_p90),
+            "Posts por semana": _label_number(self.posts_per_week),
+            "Métricas por tipo": {
+                label: {"Posts": values["posts"], "Me gusta promedio": _label_number(values["likes_mean"]),
+                        "Comentarios promedio": _label_number(values["comments_mean"])}
+                for label, values in self.by_media_type.items()
+            },
+            "Últimos X Posts": [post.to_dict() for post in self.posts],
+        }
+        if self.profile_error is not None:
+            data["Error al obtener perfil"] = self.profile_error
+        if self.media_error is not None:
+            data["Error al obtener medios"] = self.media_error
+        return data
+
+    def to_raw(self):
+        """Forma compacta sin etiquetas para diarios internos (inversa de from_raw)."""
+        raw = {name: getattr(self, name) for name in self.__slots__ if name != 'posts'}
+        raw['posts'] = [post.to_raw() for post in self.posts]
+        return raw
+
+    @classmethod
+    def from_raw(cls, raw):
+        raw = dict(raw)
+        posts = [PostRecord.from_raw(post) for post in raw.pop('posts', [])]
+        return cls(posts=posts, **raw)
+
+def account_as_dict(account):
+    """Las exportaciones aceptan AccountRecord o diccionarios ya etiquetados (p. ej. leídos de NDJSON)."""
+    return account.to_dict() if isinstance(account, AccountRecord) else account
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave: solo la primera se ejecuta y las demás comparten su resultado."""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._lock = Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+inflight_requests = SingleFlight()
+
+def fetch_user_profile(username, force_refresh=False, cancel_event=None):
+    """Perfil de la cuenta; peticiones simultáneas por el mismo usuario se resuelven con una sola.
+
+    Si cancel_event se activa antes de la respuesta, devuelve el error "Cancelled".
+    """
+    key = ("web_profile_info", username, force_refresh, cancel_event)
+    return inflight_requests.do(key, _fetch_user_profile, username, force_refresh, cancel_event)
+
+def _fetch_user_profile(username, force_refresh=False, cancel_event=None):
+    with metrics.timer("fetch_duration_seconds", stage="profile"):
+        return _request_user_profile(username, force_refresh, cancel_event)
+
+def _request_user_profile(username, force_refresh=False, cancel_event=None):
+    url = f"{INSTAGRAM_API_BASE}/users/web_profile_info/?username={username}"
+    cache_params = {"username": username}
     try:
-        response = requests.get(url, headers=get_headers(), timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = None if force_refresh else response_cache.get("web_profile_info", cache_params)
+        if data is None:
+            response = get_client().get(url, timeout=10, endpoint="web_profile_info", cancel_event=cancel_event)
+
+            if response.status_code == 401:
+                return {"error": "Unauthorized", "message": "Revisa tus cookies o autenticación."}
+            if response.status_code == 429:
+                return {"error": "Rate-limited", "message": "Demasiadas peticiones. Espera un tiempo."}
+            if response.status_code == 404:
+                return {"error": "Not Found", "message": "Usuario no encontrado"}
+
+            response.raise_for_status()
+            with metrics.timer("json_parse_seconds", endpoint="web_profile_info"):
+                data = response.json()
 
-        if response.status_code == 401:
-            return {"error": "Unauthorized", "message": "Revisa tus cookies o autenticación."}
-        if response.status_code == 429:
-            return {"error": "Rate-limited", "message": "Demasiadas peticiones. Espera un tiempo."}
-        if response.status_code == 404:
-            return {"error": "Not Found", "message": "Usuario no encontrado"}
+            if 'data' in data and 'user' in data['data']:
+                response_cache.put("web_profile_info", cache_params, data)
 
         if 'data' not in data or 'user' not in data['data']:
             return {"error": "Invalid Response", "message": "Estructura de respuesta inesperada."}
 
         return data['data']['user']
+    except RequestCancelled:
+        return {"error": "Cancelled", "message": "Análisis cancelado."}
     except requests.exceptions.Timeout:
         return {"error": "Timeout", "message": "La petición excedió el tiempo límite."}
     except requests.exceptions.RequestException as e:
@@ -68,502 +1146,1810 @@ def fetch_user_profile(username):
     except Exception as e:
         return {"error": "Unknown Error", "message": str(e)}
 
-def fetch_user_media(user_data, username, posts_count):
+class FeedRequestError(Exception):
+    """Fallo al pedir una página del feed; result es el dict {"error", "message"} que devuelve fetch_user_media."""
+
+    def __init__(self, result):
+        super().__init__(result["message"])
+        self.result = result
+
+def _fetch_feed_page(user_id, username, count, max_id=None, force_refresh=False, cancel_event=None):
+    """Descarga y parsea una página del feed (o la toma de la caché). Lanza FeedRequestError si falla."""
+    url = f"{INSTAGRAM_API_BASE}/feed/user/{user_id}/?count={count}"
+    if max_id:
+        url += f"&max_id={max_id}"
+    cache_params = {"user_id": user_id, "count": count, "max_id": max_id or ""}
+
+    try:
+        data = None if force_refresh else response_cache.get("feed", cache_params)
+        if data is None:
+            response = get_client().get(url, timeout=10, endpoint="feed", cancel_event=cancel_event)
+
+            if response.status_code == 401:
+                raise FeedRequestError({"error": "Unauthorized", "message": "Revisa tus cookies o autenticación."})
+            if response.status_code == 429:
+                raise FeedRequestError({"error": "Rate-limited", "message": "Demasiadas peticiones. Espera un tiempo."})
+            if response.status_code == 404:
+                raise FeedRequestError({"error": "Not Found", "message": f"No se encontraron medios para el usuario {username}."})
+
+            response.raise_for_status()
+            with metrics.timer("json_parse_seconds", endpoint="feed"):
+                data = response.json()
+            response_cache.put("feed", cache_params, data)
+        return data
+
+    except RequestCancelled:
+        raise FeedRequestError({"error": "Cancelled", "message": "Análisis cancelado."})
+    except requests.exceptions.Timeout:
+        raise FeedRequestError({"error": "Timeout", "message": "La petición de medios excedió el tiempo límite."})
+    except requests.exceptions.RequestException as e:
+        raise FeedRequestError({"error": "Request Error", "message": f"Error al obtener medios para {username}: {e}"})
+    except json.JSONDecodeError as e:
+        raise FeedRequestError({"error": "JSON Parse Error", "message": f"Error al parsear JSON para {username}: {e}. Respuesta: {response.text[:200]}..."})
+
+def iter_feed_pages(user_id, username, limit=None, force_refresh=False, keep_going=None, cancel_event=None):
+    """Genera las páginas del feed ya compactadas, de la más reciente a la más antigua.
+
+    Cada página se pide cuando el consumidor termina la anterior, así que nunca hay más de una en
+    memoria. limit acota los posts pedidos (None = sin límite) y keep_going(items), si se indica,
+    decide con cada página si hace falta pedir más. Si cancel_event se activa, no se piden más
+    páginas y se lanza FeedRequestError con el error "Cancelled".
+    """
+    fetched = 0
+    count = FEED_PAGE_SIZE if limit is None else min(limit, FEED_PAGE_SIZE)
+    data = _fetch_feed_page(user_id, username, count, None, force_refresh, cancel_event)
+
+    while True:
+        items = [compact_feed_item(item) for item in data.get('items', []) if item]
+        fetched += len(items)
+        next_max_id = data.get('next_max_id') or data.get('next_max_id_v2')
+        has_more = bool(data.get('more_available') and next_max_id and items)
+        del data
+
+        if has_more and limit is not None:
+            has_more = fetched < limit
+        if has_more and keep_going is not None:
+            has_more = keep_going(items)
+        if has_more and cancel_event is not None and cancel_event.is_set():
+            # La cuenta queda a medias: el llamador la descarta en vez de guardar un feed incompleto
+            raise FeedRequestError({"error": "Cancelled", "message": "Análisis cancelado."})
+
+        yield items
+
+        if not has_more:
+            return
+        count = FEED_PAGE_SIZE if limit is None else min(limit - fetched, FEED_PAGE_SIZE)
+        data = _fetch_feed_page(user_id, username, count, next_max_id, force_refresh, cancel_event)
+
+def _as_timestamp(since):
+    if since is None:
+        return None
+    return int(since.timestamp()) if isinstance(since, datetime) else int(since)
+
+def fetch_user_media(user_data, username, posts_count, force_refresh=False, since=None, cancel_event=None):
+    """Obtiene los posts de la cuenta y calcula sus métricas.
+
+    posts_count es el tamaño de la ventana (None = sin límite) y since (datetime o timestamp) descarta
+    los posts anteriores a esa fecha; con ambos se aplica el más restrictivo. Peticiones simultáneas
+    por el mismo user id y la misma ventana comparten una única descarga. Si cancel_event se activa
+    antes de terminar, devuelve el error "Cancelled" y no guarda nada en feed_store.
+    """
     if not user_data or "error" in user_data:
         return user_data
+    key = ("feed", user_data['id'], posts_count, _as_timestamp(since), force_refresh, cancel_event)
+    return inflight_requests.do(key, _fetch_user_media, user_data, username, posts_count, force_refresh, since, cancel_event)
 
+def _fetch_user_media(user_data, username, posts_count, force_refresh=False, since=None, cancel_event=None):
+    with metrics.timer("fetch_duration_seconds", stage="media"):
+        return _collect_user_media(user_data, username, posts_count, force_refresh, since, cancel_event)
+
+def _collect_user_media(user_data, username, posts_count, force_refresh=False, since=None, cancel_event=None):
     user_id = user_data['id']
+    since_ts = _as_timestamp(since)
     all_timeline_media = []
-    next_max_id = None
-    
-    TARGET_POSTS_COUNT = posts_count
-    
-    while len(all_timeline_media) < TARGET_POSTS_COUNT:
-        remaining_posts = TARGET_POSTS_COUNT - len(all_timeline_media)
-        request_count = min(remaining_posts, 50) 
-
-        url = f"https://i.instagram.com/api/v1/feed/user/{user_id}/?count={request_count}"
-        if next_max_id:
-            url += f"&max_id={next_max_id}"
-
+    # Los PostRecord se construyen página a página, mientras se descarga la siguiente
+    records_by_pk = {}
+    # True cuando una página llega a un post guardado: solo entonces lo guardado continúa lo descargado
+    reached_stored = False
+
+    stored_state = None if force_refresh else feed_store.load(user_id)
+    stored_items = stored_state["items"] if stored_state else []
+    known_pks = {item.get('pk') for item in stored_items}
+
+    def select_window(items):
+        if since_ts is not None:
+            items = [item for item in items if (item.get('taken_at') or 0) >= since_ts]
+        return items if posts_count is None else items[:posts_count]
+
+    def keep_going(items):
+        # Fecha límite: fuera de los fijados, el feed llega ordenado del más reciente al más antiguo
+        if since_ts is not None and any(not item['pinned'] and (item['taken_at'] or 0) < since_ts for item in items):
+            return False
+        window = all_timeline_media + items
+        # Sincronización incremental: un post ya conocido (no fijado) indica que lo siguiente está guardado
+        if any(item['pk'] in known_pks and not item['pinned'] for item in items):
+            window = merge_feed_items(window, stored_items)
+            if since_ts is not None and any(not item.get('pinned') and (item.get('taken_at') or 0) < since_ts for item in window):
+                return False
+        return posts_count is None or len(select_window(window)) < posts_count
+
+    if posts_count is None or posts_count > 0:
+        # Con fecha límite los posts descartados (fijados antiguos) no cuentan: el corte lo decide keep_going
+        pages = iter_feed_pages(user_id, username, limit=posts_count if since_ts is None else None,
+                                force_refresh=force_refresh, keep_going=keep_going, cancel_event=cancel_event)
+        page_count = 0
         try:
-            response = requests.get(url, headers=get_headers(), timeout=10)
-            
-            if response.status_code == 401:
-                return {"error": "Unauthorized", "message": "Revisa tus cookies o autenticación."}
-            if response.status_code == 429:
-                return {"error": "Rate-limited", "message": "Demasiadas peticiones. Espera un tiempo."}
-            if response.status_code == 404: 
-                return {"error": "Not Found", "message": f"No se encontraron medios para el usuario {username}."}
-            
-            response.raise_for_status() 
-            data = response.json()
-            
-            current_items = data.get('items', [])
-            all_timeline_media.extend(current_items)
-
-            next_max_id = data.get('next_max_id') or data.get('next_max_id_v2')
-            
-            if not data.get('more_available') or not next_max_id or not current_items:
-                break 
-
-            time.sleep(1) 
-
-        except requests.exceptions.Timeout:
-            return {"error": "Timeout", "message": "La petición de medios excedió el tiempo límite."}
-        except requests.exceptions.RequestException as e:
-            return {"error": "Request Error", "message": f"Error al obtener medios para {username}: {e}"}
-        except json.JSONDecodeError as e:
-            return {"error": "JSON Parse Error", "message": f"Error al parsear JSON para {username}: {e}. Respuesta: {response.text[:200]}..."}
+            for items in pages:
+                page_count += 1
+                all_timeline_media.extend(items)
+                reached_stored = reached_stored or any(item['pk'] in known_pks and not item['pinned'] for item in items)
+                for item in items:
+                    records_by_pk[item['pk']] = PostRecord.from_item(item)
+        except FeedRequestError as e:
+            return e.result
         except Exception as e:
             return {"error": "Unknown Error", "message": f"Error desconocido al obtener medios para {username}: {e}"}
+        finally:
+            pages.close()
+            metrics.observe("feed_pages_per_account", page_count, buckets=PAGE_BUCKETS)
+
+    # Si la paginación se detuvo antes (límite de posts o fecha), entre lo descargado y lo guardado
+    # puede faltar un tramo del feed: se descarta lo guardado para no unir posts no contiguos
+    if reached_stored:
+        all_timeline_media = merge_feed_items(all_timeline_media, stored_items)
+    feed_store.save(user_id, all_timeline_media)
+    timeline_media = select_window(all_timeline_media)
+
+    timeline_media = [item for item in timeline_media if item]
+    account_info = AccountRecord.from_profile(user_data)
+    account_info.apply_metrics(compute_account_metrics(timeline_media, account_info.followers))
+    account_info.posts = [records_by_pk.get(item.get('pk')) or PostRecord.from_item(item) for item in timeline_media]
+    return account_info
 
-    timeline_media = all_timeline_media[:TARGET_POSTS_COUNT]
-
-    total_likes = 0
-    total_comments = 0
-    media_count_for_averages = 0 
-    
-    recent_media_data = []
-
-    for item in timeline_media:
-        if not item:
+# --- SALIDA EN STREAMING (NDJSON) ---
+
+class NDJSONWriter:
+    """Escribe un objeto JSON compacto por línea, visible en disco en cuanto se escribe."""
+
+    def __init__(self, path, mode='w', fsync=False):
+        self.path = path
+        self.mode = mode
+        self.fsync = fsync
+        self._file = None
+
+    def write(self, obj):
+        if self._file is None:
+            self._file = open(self.path, self.mode, encoding='utf-8')
+        self._file.write(json.dumps(obj, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def iter_ndjson(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+class ResultStream:
+    """Resultados guardados en un archivo NDJSON; se recorren cuenta a cuenta sin cargarlos todos en memoria.
+
+    Las líneas llevan las etiquetas de exportación (AccountRecord.to_dict) o, con raw, la forma
+    compacta de AccountRecord.to_raw; en ese caso se devuelven AccountRecord.
+    """
+
+    def __init__(self, path, raw=False):
+        self.path = path
+        self.raw = raw
+        self._offsets = []
+        self._indexed_bytes = 0
+
+    def __iter__(self):
+        if self.raw:
+            return map(AccountRecord.from_raw, iter_ndjson(self.path))
+        return iter_ndjson(self.path)
+
+    def __len__(self):
+        return len(self._index())
+
+    def _index(self):
+        """Posiciones de inicio de cada línea; solo se lee lo añadido al archivo desde la última llamada."""
+        if not os.path.exists(self.path):
+            return []
+        if os.path.getsize(self.path) < self._indexed_bytes:
+            # El archivo se ha reescrito: se vuelve a indexar desde el principio
+            self._offsets, self._indexed_bytes = [], 0
+        with open(self.path, 'rb') as f:
+            f.seek(self._indexed_bytes)
+            offset = self._indexed_bytes
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Línea todavía a medio escribir
+                if line.strip():
+                    self._offsets.append(offset)
+                offset += len(line)
+            self._indexed_bytes = offset
+        return self._offsets
+
+    def page(self, start, count):
+        """Devuelve las cuentas [start, start + count) leyendo solo esas líneas del archivo."""
+        offsets = self._index()[start:start + count]
+        page = []
+        if offsets:
+            with open(self.path, 'rb') as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    page.append(json.loads(f.readline()))
+        return [AccountRecord.from_raw(raw) for raw in page] if self.raw else page
+
+class CheckpointJournal:
+    """Diario append-only (un JSON por línea) con las cuentas ya terminadas de un trabajo."""
+
+    def __init__(self, job_id, directory=JOBS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{job_id}.jsonl")
+        self._writer = NDJSONWriter(self.path, mode='a', fsync=True)
+
+    def load(self):
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, 'rb+') as f:
+            content = f.read()
+            # Una caída a mitad de escritura deja una última línea incompleta: se descarta
+            valid_length = content.rfind(b'\n') + 1
+            if valid_length < len(content):
+                f.truncate(valid_length)
+        for line in content[:valid_length].decode('utf-8').splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                completed[entry["username"]] = AccountRecord.from_raw(entry["data"])
+        return completed
+
+    def append(self, username, account_info):
+        self._writer.write({"username": username, "data": account_info.to_raw()})
+
+    def close(self):
+        self._writer.close()
+
+def is_final_result(account_info):
+    """Cuentas que no vale la pena repetir al reanudar: datos completos o usuario inexistente."""
+    if account_info.media_error is not None:
+        return False
+    return account_info.profile_error is None or account_info.profile_error == "Usuario no encontrado"
+
+# --- NORMALIZACIÓN DE ENTRADA ---
+
+INSTAGRAM_HOSTS = {'instagram.com', 'www.instagram.com', 'm.instagram.com', 'instagr.am', 'www.instagr.am'}
+# Primeros segmentos de URL de Instagram que no son perfiles
+NON_PROFILE_PATHS = {'p', 'reel', 'reels', 'tv', 'explore', 'accounts', 'direct'}
+USERNAME_PATTERN = re.compile(r'[a-z0-9._]{1,30}')
+
+def split_usernames(text):
+    """Separa una lista pegada: comas, puntos y coma, espacios o saltos de línea."""
+    return [part for part in re.split(r'[\s,;]+', text) if part]
+
+def canonical_username(username):
+    """Usuario en minúsculas y sin '@', a partir de un nombre o de una URL de perfil; '' si no es válido."""
+    value = username.strip().lower()
+    if '/' in value or 'instagram.com' in value or 'instagr.am' in value:
+        parsed = urlsplit(value if '://' in value else 'https://' + value)
+        if parsed.hostname not in INSTAGRAM_HOSTS:
+            return ''
+        segments = [segment for segment in parsed.path.split('/') if segment]
+        if segments[:1] == ['stories']:
+            # instagram.com/stories/<usuario>/<id>/
+            segments = segments[1:]
+        if not segments or segments[0] in NON_PROFILE_PATHS:
+            return ''
+        value = segments[0]
+    value = value.lstrip('@')
+    return value if USERNAME_PATTERN.fullmatch(value) else ''
+
+def normalize_usernames(raw_usernames):
+    """Canonicaliza y quita duplicados conservando el orden de primera aparición.
+
+    Devuelve (usuarios, cantidad de duplicados, entradas no válidas tal como llegaron).
+    """
+    usernames = []
+    seen = set()
+    duplicates = 0
+    invalid = []
+    for raw in raw_usernames:
+        if not raw or not raw.strip():
             continue
+        username = canonical_username(raw)
+        if not username:
+            invalid.append(raw.strip())
+        elif username in seen:
+            duplicates += 1
+        else:
+            seen.add(username)
+            usernames.append(username)
+    return usernames, duplicates, invalid
+
+# --- HISTÓRICO DE SNAPSHOTS ---
+
+# Cuentas acumuladas por transacción al guardar snapshots
+HISTORY_BATCH_SIZE = 200
+# Columnas de account_snapshots sobre las que se pueden pedir tendencias
+HISTORY_METRICS = ('followers', 'following', 'media_count', 'avg_likes', 'avg_comments', 'engagement_rate',
+                   'likes_median', 'posts_per_week')
+SECONDS_PER_DAY = 86400
+
+class SnapshotStore:
+    """Snapshots de cuentas y posts de cada ejecución en SQLite, indexados por (usuario, momento).
+
+    Permite calcular crecimiento, velocidad de likes por post y tendencias sin volver a hacer scraping.
+    """
+
+    def __init__(self, path, batch_size=HISTORY_BATCH_SIZE):
+        self.enabled = bool(path)
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = Lock()
+        self._conn = None
+        self._pending_accounts = []
+        self._pending_posts = []
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = open_sqlite(self.path)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS runs ("
+                    "run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_at REAL NOT NULL, finished_at REAL, "
+                    "accounts INTEGER NOT NULL DEFAULT 0)"
+                )
+                # La clave primaria (username, ts) es el índice de las consultas por cuenta y rango de fechas
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS account_snapshots ("
+                    "username TEXT NOT NULL, ts REAL NOT NULL, run_id INTEGER NOT NULL, "
+                    + ", ".join(f"{name} {'INTEGER' if name in ('followers', 'following', 'media_count') else 'REAL'}"
+                                for name in HISTORY_METRICS)
+                    + ", posts_for_average INTEGER, PRIMARY KEY (username, ts)) WITHOUT ROWID"
+                )
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS post_snapshots ("
+                    "pk INTEGER NOT NULL, ts REAL NOT NULL, username TEXT NOT NULL, run_id INTEGER NOT NULL, "
+                    "taken_at INTEGER, media_type INTEGER, likes INTEGER, comments INTEGER, "
+                    "PRIMARY KEY (pk, ts)) WITHOUT ROWID"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_post_snapshots_username ON post_snapshots (username, ts)")
+                # Para el recuento de cuentas de finish_run
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_account_snapshots_run ON account_snapshots (run_id)")
+        return self._conn
+
+    def start_run(self, started_at=None):
+        """Abre una ejecución y devuelve su run_id (None si el histórico está desactivado)."""
+        if not self.enabled:
+            return None
+        with self._lock, self._connection() as conn:
+            return conn.execute("INSERT INTO runs (started_at) VALUES (?)", (started_at or time.time(),)).lastrowid
+
+    def record(self, run_id, account_info, ts=None):
+        """Añade el snapshot de una cuenta con perfil; se escribe en bloques de batch_size cuentas."""
+        if run_id is None or account_info.profile_error is not None:
+            return
+        ts = ts or time.time()
+        with self._lock:
+            self._pending_accounts.append(
+                (account_info.username, ts, run_id, *(getattr(account_info, name) for name in HISTORY_METRICS),
+                 account_info.posts_for_average)
+            )
+            self._pending_posts.extend(
+                (post.pk, ts, account_info.username, run_id, post.taken_at, post.media_type, post.likes, post.comments)
+                for post in account_info.posts if post.pk is not None
+            )
+            if len(self._pending_accounts) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending_accounts:
+            return
+        with self._connection() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO account_snapshots (username, ts, run_id, {', '.join(HISTORY_METRICS)}, posts_for_average) "
+                f"VALUES ({', '.join('?' * (len(HISTORY_METRICS) + 4))})",
+                self._pending_accounts,
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO post_snapshots (pk, ts, username, run_id, taken_at, media_type, likes, comments) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending_posts,
+            )
+        self._pending_accounts.clear()
+        self._pending_posts.clear()
+
+    def finish_run(self, run_id):
+        """Escribe lo pendiente, cierra la ejecución y devuelve cuántas cuentas se guardaron en ella."""
+        if run_id is None:
+            return 0
+        with self._lock:
+            self._flush()
+            with self._connection() as conn:
+                accounts = conn.execute("SELECT COUNT(*) FROM account_snapshots WHERE run_id = ?", (run_id,)).fetchone()[0]
+                conn.execute("UPDATE runs SET finished_at = ?, accounts = ? WHERE run_id = ?", (time.time(), accounts, run_id))
+        return accounts
+
+    @staticmethod
+    def _username_filter(usernames):
+        """Condición SQL y parámetros para limitar a unas cuentas; la lista va como un único parámetro JSON."""
+        if usernames is None:
+            return "", ()
+        return " AND username IN (SELECT value FROM json_each(?))", (json.dumps([str(name) for name in usernames]),)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def account_history(self, username, since=None, until=None):
+        """Snapshots de una cuenta, del más antiguo al más reciente."""
+        return self._query(
+            "SELECT * FROM account_snapshots WHERE username = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+            (username, _as_timestamp(since) or 0, _as_timestamp(until) or float('inf')),
+        )
 
-        caption = item.get('caption', {}).get('text', 'No caption')
-        media_url = item.get('image_versions2', {}).get('candidates', [{}])[0].get('url', 'No media URL')
-        like_count = item.get('like_count', 0)
-        comment_count = item.get('comment_count', 0)
-        
-        timestamp = item.get('taken_at', 0) * 1000 
+    def growth(self, username, since=None):
+        """Variación entre el primer y el último snapshot de la cuenta (None si no hay ninguno)."""
+        history = self.account_history(username, since)
+        if not history:
+            return None
+        first, last = history[0], history[-1]
+        days = (last["ts"] - first["ts"]) / SECONDS_PER_DAY
+        growth = {"username": username, "snapshots": len(history), "from": first["ts"], "to": last["ts"], "days": days}
+        for name in HISTORY_METRICS:
+            start, end = first[name], last[name]
+            delta = end - start if start is not None and end is not None else None
+            growth[name] = end
+            growth[f"{name}_delta"] = delta
+            growth[f"{name}_per_day"] = delta / days if delta is not None and days > 0 else None
+        growth["followers_growth_pct"] = (growth["followers_delta"] / first["followers"] * 100
+                                          if growth["followers_delta"] is not None and first["followers"] else None)
+        return growth
+
+    def like_velocity(self, username, since=None):
+        """Likes y comentarios ganados por hora por cada post visto en al menos dos snapshots."""
+        rows = self._query(
+            "SELECT pk, ts, taken_at, likes, comments FROM post_snapshots "
+            "WHERE username = ? AND ts >= ? ORDER BY pk, ts",
+            (username, _as_timestamp(since) or 0),
+        )
+        velocities = []
+        start = 0
+        while start < len(rows):
+            end = start
+            while end + 1 < len(rows) and rows[end + 1]["pk"] == rows[start]["pk"]:
+                end += 1
+            first, last = rows[start], rows[end]
+            hours = (last["ts"] - first["ts"]) / 3600
+            if hours > 0:
+                velocities.append({
+                    "pk": first["pk"],
+                    "taken_at": last["taken_at"],
+                    "observations": end - start + 1,
+                    "likes": last["likes"],
+                    "likes_per_hour": ((last["likes"] or 0) - (first["likes"] or 0)) / hours,
+                    "comments_per_hour": ((last["comments"] or 0) - (first["comments"] or 0)) / hours,
+                })
+            start = end + 1
+        velocities.sort(key=lambda velocity: velocity["likes_per_hour"], reverse=True)
+        return velocities
+
+    def trends(self, metric='followers', since=None, usernames=None):
+        """Pendiente por día (mínimos cuadrados) de una métrica por cuenta, de mayor a menor crecimiento."""
+        if metric not in HISTORY_METRICS:
+            raise ValueError(f"métrica desconocida '{metric}'; disponibles: {', '.join(HISTORY_METRICS)}")
+        # Sumas de la regresión en SQL, con el tiempo en días relativo al primer snapshot de cada cuenta;
+        # el filtro por cuentas y ventana usa la clave primaria (username, ts)
+        username_sql, username_params = self._username_filter(usernames)
+        rows = self._query(
+            f"SELECT username, COUNT(*) AS n, MIN(ts) AS first_ts, MAX(ts) AS last_ts, "
+            f"SUM(x) AS sx, SUM(y) AS sy, SUM(x * x) AS sxx, SUM(x * y) AS sxy FROM ("
+            f"  SELECT username, ts, {metric} AS y, "
+            f"  (ts - MIN(ts) OVER (PARTITION BY username)) / {SECONDS_PER_DAY} AS x "
+            f"  FROM account_snapshots WHERE ts >= ? AND {metric} IS NOT NULL{username_sql}"
+            f") GROUP BY username",
+            (_as_timestamp(since) or 0, *username_params),
+        )
+        trends = []
+        for row in rows:
+            n = row["n"]
+            denominator = n * row["sxx"] - row["sx"] ** 2
+            trends.append({
+                "username": row["username"],
+                "metric": metric,
+                "snapshots": n,
+                "from": row["first_ts"],
+                "to": row["last_ts"],
+                "mean": row["sy"] / n,
+                "slope_per_day": (n * row["sxy"] - row["sx"] * row["sy"]) / denominator if n > 1 and denominator else None,
+            })
+        trends.sort(key=lambda trend: trend["slope_per_day"] if trend["slope_per_day"] is not None else float('-inf'),
+                    reverse=True)
+        return trends
+
+    def history_rows(self, usernames=None, since=None):
+        """Snapshots con la variación respecto al anterior de la misma cuenta, para la hoja de histórico."""
+        username_sql, username_params = self._username_filter(usernames)
+        return self._query(
+            "SELECT username, ts, run_id, followers, "
+            "followers - LAG(followers) OVER (PARTITION BY username ORDER BY ts) AS followers_delta, "
+            "following, media_count, "
+            "media_count - LAG(media_count) OVER (PARTITION BY username ORDER BY ts) AS media_count_delta, "
+            "avg_likes, avg_comments, engagement_rate, "
+            "engagement_rate - LAG(engagement_rate) OVER (PARTITION BY username ORDER BY ts) AS engagement_rate_delta, "
+            f"posts_per_week FROM account_snapshots WHERE ts >= ?{username_sql} ORDER BY username, ts",
+            (_as_timestamp(since) or 0, *username_params),
+        )
 
-        if like_count is not None and comment_count is not None:
-            total_likes += like_count
-            total_comments += comment_count
-            media_count_for_averages += 1 
-        
-        recent_media_data.append({
-            "PostId": item.get('pk'),
-            "Type": 'Foto' if item.get('media_type') == 1 else ('Video' if item.get('media_type') == 2 else 'Otro'),
-            "Likes": like_count,
-            "Comments": comment_count,
-            "Caption": caption[:70] + '...' if len(caption) > 70 else caption,
-            "PostDate": datetime.fromtimestamp(timestamp / 1000).strftime('%d/%m/%Y') if timestamp else 'N/A',
-            "MediaUrl": media_url,
-            "EsCarrusel": 'Sí' if item.get('carousel_media') else 'No'
-        })
-
-    average_likes = round(total_likes / media_count_for_averages, 2) if media_count_for_averages > 0 else 'No Disponible'
-    average_comments = round(total_comments / media_count_for_averages, 2) if media_count_for_averages > 0 else 'No Disponible'
-
-    followers_count = user_data.get('edge_followed_by', {}).get('count', 0)
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._flush()
+                self._conn.close()
+                self._conn = None
+
+snapshot_store = SnapshotStore(HISTORY_DB_PATH)
+
+# --- DESCARGA DE MEDIOS ---
+
+# Descargas pendientes como máximo: al llenarse, el hilo que la alimenta espera a que los hilos avancen
+MEDIA_QUEUE_SIZE = 256
+MEDIA_CHUNK_SIZE = 64 * 1024
+MEDIA_TIMEOUT_SECONDS = 30
+MEDIA_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/heic': '.heic',
+                    'video/mp4': '.mp4'}
+
+def parse_media_resolution(value):
+    """'max', 'min' o un ancho en píxeles."""
+    value = str(value).strip().lower()
+    if value in ('max', 'min'):
+        return value
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    raise argparse.ArgumentTypeError(f"resolución inválida '{value}', usa max, min o un ancho en píxeles")
+
+def select_candidate(candidates, resolution='max'):
+    """La mayor o la menor resolución, o la menor que alcance el ancho pedido (la mayor si ninguna llega)."""
+    ordered = sorted(candidates, key=lambda candidate: (candidate.get('width') or 0) * (candidate.get('height') or 0))
+    if not ordered:
+        return None
+    if resolution == 'max':
+        return ordered[-1]
+    if resolution == 'min':
+        return ordered[0]
+    return next((candidate for candidate in ordered if (candidate.get('width') or 0) >= resolution), ordered[-1])
+
+def _media_extension(url, content_type):
+    extension = os.path.splitext(urlsplit(url).path)[1].lower()
+    if extension in MEDIA_EXTENSIONS.values():
+        return extension
+    return MEDIA_EXTENSIONS.get((content_type or '').split(';')[0].strip().lower(), '.bin')
+
+class MediaDownloadError(Exception):
+    pass
+
+class MediaDownloader:
+    """Descarga en paralelo los medios de los posts (carruseles incluidos) a un almacén direccionado por contenido.
+
+    Cada archivo se guarda una sola vez como objects/<sha256[:2]>/<sha256><ext>, así que los reposts no
+    ocupan espacio doble, y el índice SQLite (id del medio + resolución -> archivo) evita volver a
+    descargar en otra ejecución lo que ya está guardado. Las descargas tienen su propio limitador y su
+    propia sesión HTTP: nunca consumen el presupuesto de peticiones de las credenciales.
+
+    Las descargas pendientes también viven en el índice (pending_downloads): submit() solo las anota y
+    un hilo las va pasando a una cola acotada en memoria, así que el análisis nunca espera a las
+    descargas y la memoria no crece con el retraso. Las que queden pendientes si el proceso muere se
+    descargan en la siguiente ejecución con la misma carpeta.
+    """
+
+    def __init__(self, directory=MEDIA_DIR, resolution='max', workers=MEDIA_WORKERS,
+                 requests_per_second=MEDIA_REQUESTS_PER_SECOND, queue_size=MEDIA_QUEUE_SIZE, max_retries=MAX_RETRIES):
+        self.directory = directory
+        self.resolution = resolution
+        self.max_retries = max_retries
+        # El ritmo solo baja ante 429/5xx y se recupera hasta el configurado, nunca por encima
+        self.limiter = AdaptiveRateLimiter(requests_per_second, min(MIN_REQUESTS_PER_SECOND, requests_per_second),
+                                           requests_per_second)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.stats = {"queued": 0, "downloaded": 0, "deduplicated": 0, "already_stored": 0, "failed": 0, "bytes": 0}
+
+        self._temp_dir = os.path.join(directory, 'tmp')
+        os.makedirs(self._temp_dir, exist_ok=True)
+        self._lock = Lock()
+        self._index = open_sqlite(os.path.join(directory, 'index.sqlite3'))
+        with self._index:
+            self._index.execute(
+                "CREATE TABLE IF NOT EXISTS media_files ("
+                "media_key TEXT PRIMARY KEY, media_id TEXT NOT NULL, username TEXT, post_pk INTEGER, "
+                "sha256 TEXT NOT NULL, path TEXT NOT NULL, width INTEGER, height INTEGER, size INTEGER NOT NULL, "
+                "url TEXT, downloaded_at REAL NOT NULL)"
+            )
+            self._index.execute("CREATE INDEX IF NOT EXISTS idx_media_files_post ON media_files (post_pk)")
+            # Una fila por descarga pendiente o en curso; se borra al terminar (bien o con error)
+            self._index.execute(
+                "CREATE TABLE IF NOT EXISTS pending_downloads ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, media_key TEXT NOT NULL UNIQUE, media_id TEXT NOT NULL, "
+                "username TEXT, post_pk INTEGER, candidate TEXT NOT NULL)"
+            )
+
+        self._queue = Queue(maxsize=queue_size)
+        self._threads = [Thread(target=self._worker, daemon=True) for _ in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+        self._feed_batch = max(1, queue_size)
+        self._wakeup = Event()
+        self._closing = False
+        self._feeder = Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _count(self, result, size=0):
+        with self._lock:
+            self.stats[result] += 1
+            self.stats["bytes"] += size
+        metrics.inc("media_downloads_total", result=result)
+        if size:
+            metrics.inc("media_download_bytes_total", size)
+
+    def submit(self, account_info):
+        """Anota como pendientes los medios de los posts de una cuenta y devuelve cuántas descargas añadió.
+
+        No espera a la cola de descargas: solo escribe en el índice. Los medios ya guardados o ya
+        pendientes no se repiten.
+        """
+        rows = []
+        failed = 0
+        for post in account_info.posts:
+            for media_id, candidates in post.media:
+                try:
+                    candidate = select_candidate(candidates, self.resolution)
+                    key = f"{media_id}@{candidate.get('width') or 0}x{candidate.get('height') or 0}"
+                    rows.append((key, str(media_id), account_info.username, post.pk, json.dumps(candidate)))
+                except Exception:
+                    failed += 1
+        queued = already_stored = 0
+        if rows:
+            with self._lock, self._index as conn:
+                for row in rows:
+                    if conn.execute("SELECT 1 FROM media_files WHERE media_key = ?", (row[0],)).fetchone():
+                        already_stored += 1
+                        continue
+                    queued += conn.execute(
+                        "INSERT OR IGNORE INTO pending_downloads (media_key, media_id, username, post_pk, candidate) "
+                        "VALUES (?, ?, ?, ?, ?)", row,
+                    ).rowcount
+                self.stats["queued"] += queued
+        for result, count in (("already_stored", already_stored), ("failed", failed)):
+            for _ in range(count):
+                self._count(result)
+        if queued:
+            self._wakeup.set()
+        return queued
+
+    def _feed(self):
+        """Pasa las descargas pendientes del índice a la cola acotada, en orden de llegada."""
+        last_id = 0
+        while True:
+            self._wakeup.clear()
+            with self._lock:
+                rows = self._index.execute(
+                    "SELECT id, media_key, media_id, username, post_pk, candidate FROM pending_downloads "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self._feed_batch),
+                ).fetchall()
+            if not rows:
+                if self._closing:
+                    return
+                self._wakeup.wait()
+                continue
+            for row_id, key, media_id, username, post_pk, candidate in rows:
+                last_id = row_id
+                try:
+                    candidate = json.loads(candidate)
+                except ValueError:
+                    self._finish_pending(key)
+                    self._count("failed")
+                    continue
+                # Bloquea mientras la cola está llena: espera este hilo, no el análisis
+                self._queue.put((key, media_id, username, post_pk, candidate))
+
+    def _finish_pending(self, key):
+        with self._lock, self._index as conn:
+            conn.execute("DELETE FROM pending_downloads WHERE media_key = ?", (key,))
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._download(*job)
+            except Exception:
+                self._count("failed")
+            finally:
+                if job is not None:
+                    self._finish_pending(job[0])
+                self._queue.task_done()
+
+    def _fetch_to_temp(self, url):
+        """Descarga por bloques a un temporal calculando el sha256 al vuelo; devuelve (sha256, tamaño, ruta, tipo)."""
+        for attempt in range(self.max_retries + 1):
+            wait_start = time.perf_counter()
+            self.limiter.acquire()
+            request_start = time.perf_counter()
+            metrics.inc("media_rate_limit_wait_seconds_total", request_start - wait_start)
+            try:
+                with self.session.get(url, stream=True, timeout=MEDIA_TIMEOUT_SECONDS) as response:
+                    if response.status_code == 429 or response.status_code >= 500:
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        self.limiter.on_throttle(retry_after)
+                        if attempt == self.max_retries:
+                            raise MediaDownloadError(f"HTTP {response.status_code}")
+                        time.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+                        continue
+                    response.raise_for_status()
+
+                    digest = hashlib.sha256()
+                    size = 0
+                    fd, temp_path = tempfile.mkstemp(dir=self._temp_dir)
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            for chunk in response.iter_content(MEDIA_CHUNK_SIZE):
+                                digest.update(chunk)
+                                f.write(chunk)
+                                size += len(chunk)
+                    except BaseException:
+                        os.remove(temp_path)
+                        raise
+                    content_type = response.headers.get('Content-Type')
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            finally:
+                metrics.observe("media_download_duration_seconds", time.perf_counter() - request_start)
+            self.limiter.on_success()
+            return digest.hexdigest(), size, temp_path, content_type
+
+    def _download(self, key, media_id, username, post_pk, candidate):
+        url = candidate['url']
+        sha256, size, temp_path, content_type = self._fetch_to_temp(url)
+        relative_path = os.path.join('objects', sha256[:2], sha256 + _media_extension(url, content_type))
+        final_path = os.path.join(self.directory, relative_path)
+        with self._lock:
+            if os.path.exists(final_path):
+                # Mismo contenido ya guardado (repost o misma imagen en otra resolución)
+                os.remove(temp_path)
+                result = "deduplicated"
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(temp_path, final_path)
+                result = "downloaded"
+            with self._index:
+                self._index.execute(
+                    "INSERT OR REPLACE INTO media_files (media_key, media_id, username, post_pk, sha256, path, width, height, "
+                    "size, url, downloaded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, media_id, username, post_pk, sha256, relative_path, candidate.get('width'),
+                     candidate.get('height'), size, url, time.time()),
+                )
+        self._count(result, size if result == "downloaded" else 0)
+
+    def files_for_post(self, post_pk):
+        """Archivos guardados de un post (rutas relativas a la carpeta de medios)."""
+        with self._lock:
+            return [row[0] for row in self._index.execute(
+                "SELECT path FROM media_files WHERE post_pk = ? ORDER BY media_id", (post_pk,))]
+
+    def close(self):
+        """Espera a que terminen las descargas pendientes y devuelve las estadísticas."""
+        self._closing = True
+        self._wakeup.set()
+        self._feeder.join()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.session.close()
+        with self._lock:
+            self._index.close()
+            return dict(self.stats)
+
+def _scrape_single_account(username, posts_to_fetch, callback, position, total, force_refresh=False, cancel_event=None,
+                           since=None):
+    """Analiza un perfil y devuelve un AccountRecord (completo o parcial), o None si el análisis se canceló antes de terminarlo."""
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    clean_username = canonical_username(username)
     
-    engagement_rate = 'No Disponible'
-    if media_count_for_averages > 0 and followers_count > 0:
-        engagement_rate = round(((average_likes + average_comments) / followers_count) * 100, 2)
-        
-    is_business_account = 'Sí' if user_data.get('is_business_account') else 'No'
-    has_highlight_reels = 'Sí' if user_data.get('highlight_reel_count', 0) > 0 else 'No'
-    external_url = user_data.get('external_url', 'No disponible')
-    public_email = user_data.get('public_email', 'No disponible')
-    public_phone_number = user_data.get('public_phone_number', 'No disponible')
-    has_public_contact = 'Sí' if (public_email != 'No disponible' or public_phone_number != 'No disponible') else 'No'
-    biography_has_links = 'Sí' if user_data.get('biography') and ('http://' in user_data['biography'] or 'https://' in user_data['biography']) else 'No'
-    is_private = 'Sí' if user_data.get('is_private') else 'No'
-
-    account_info = {
-        "Nombre de usuario": user_data.get('username'),
-        "Nombre completo": user_data.get('full_name', 'No Disponible'),
-        "Biografía": user_data.get('biography', 'No Disponible'),
-        "País": user_data.get('country_block', 'No Disponible'),
-        "URL Perfil": f"https://www.instagram.com/{user_data.get('username')}",
-        "Categoría": user_data.get('category_name', 'No Disponible'),
-        "cantidad seguidores": followers_count,
-        "cantidad seguidos": user_data.get('edge_follow', {}).get('count', 'No Disponible'),
-        "cantidad de publicaciones": user_data.get('edge_owner_to_timeline_media', {}).get('count', 'No Disponible'),
-        "Está verificado ✅": 'Sí' if user_data.get('is_verified') else 'No',
-        "¿Es una cuenta profesional?": is_business_account,
-        "Tiene Historias Destacadas": has_highlight_reels,
-        "URL Externa (Bio)": external_url,
-        "Email Público": public_email,
-        "Teléfono Público": public_phone_number,
-        "Tiene Contacto Público": has_public_contact,
-        "Biografía con Links": biography_has_links,
-        "Es Cuenta Privada": is_private,
-        # Guardar la cantidad de posts usados para el promedio en los datos para mostrarlo en la GUI
-        "Posts para promedio": media_count_for_averages,
-        "Me gusta promedio 👍": average_likes,
-        "Comentarios promedio 💬": average_comments,
-        "Tasa de interacción 📊": f"{engagement_rate}%" if engagement_rate != 'No Disponible' else engagement_rate,
-        "Últimos X Posts": recent_media_data
-    }
-    return account_info
-
-def scrape_instagram_profiles(usernames_list, posts_to_fetch, callback):
-    """Función principal de scraping que reporta el progreso a la GUI."""
-    all_accounts_data = []
+    callback("log", f"[{position}/{total}] Analizando perfil: {clean_username}...")
     
-    for i, username in enumerate(usernames_list):
-        clean_username = username.strip().replace('@', '')
-        
-        callback("log", f"[{i+1}/{len(usernames_list)}] Analizando perfil: {clean_username}...")
-        
-        user_profile = fetch_user_profile(clean_username)
+    user_profile = fetch_user_profile(clean_username, force_refresh=force_refresh, cancel_event=cancel_event)
+    
+    if user_profile.get("error") == "Cancelled":
+        return None
+    if "error" in user_profile:
+        error_message = user_profile.get("message", "Error desconocido")
         
-        account_info = {}
-        if user_profile and "error" not in user_profile:
-            account_info = fetch_user_media(user_profile, clean_username, posts_to_fetch)
-            if account_info and "error" not in account_info:
-                all_accounts_data.append(account_info)
-                callback("log", f"Datos completos obtenidos para {clean_username}.")
-            else:
-                placeholder_info = {
-                    "Nombre de usuario": clean_username,
-                    "Nombre completo": user_profile.get('full_name', 'No Disponible'),
-                    "Biografía": user_profile.get('biography', 'No Disponible'),
-                    "País": user_profile.get('country_block', 'No Disponible'),
-                    "URL Perfil": f"https://www.instagram.com/{clean_username}",
-                    "Categoría": user_profile.get('category_name', 'No Disponible'),
-                    "cantidad seguidores": user_profile.get('edge_followed_by', {}).get('count', 'No Disponible'),
-                    "cantidad seguidos": user_profile.get('edge_follow', {}).get('count', 'No Disponible'),
-                    "cantidad de publicaciones": user_profile.get('edge_owner_to_timeline_media', {}).get('count', 'No Disponible'),
-                    "Está verificado ✅": 'Sí' if user_profile.get('is_verified') else 'No',
-                    "¿Es una cuenta profesional?": 'Sí' if user_profile.get('is_business_account') else 'No',
-                    "Tiene Historias Destacadas": 'Sí' if user_profile.get('highlight_reel_count', 0) > 0 else 'No',
-                    "URL Externa (Bio)": user_profile.get('external_url', 'No disponible'),
-                    "Email Público": user_profile.get('public_email', 'No disponible'),
-                    "Teléfono Público": user_profile.get('public_phone_number', 'No disponible'),
-                    "Tiene Contacto Público": 'Sí' if (user_profile.get('public_email') or user_profile.get('public_phone_number')) else 'No',
-                    "Biografía con Links": 'Sí' if user_profile.get('biography') and ('http://' in user_profile['biography'] or 'https://' in user_profile['biography']) else 'No',
-                    "Es Cuenta Privada": 'Sí' if user_profile.get('is_private') else 'No',
-                    "Posts para promedio": 0, # No se pudieron obtener posts, así que 0
-                    "Me gusta promedio 👍": 'No Disponible',
-                    "Comentarios promedio 💬": 'No Disponible',
-                    "Tasa de interacción 📊": 'No Disponible',
-                    "Últimos X Posts": [],
-                    "Error al obtener medios": account_info.get("message", "Error desconocido al obtener medios") if "error" in account_info else "N/A"
-                }
-                all_accounts_data.append(placeholder_info)
-                callback("log", f"Error o datos incompletos para {clean_username}: {account_info.get('message', 'N/A')}. Añadiendo datos parciales.")
+        if error_message == "Usuario no encontrado":
+            callback("log", f"El usuario ingresado '{clean_username}' no existe.")
         else:
-            error_message = user_profile.get("message", "Error desconocido") if user_profile and "error" in user_profile else "No Disponible"
-            
-            if error_message == "Usuario no encontrado":
-                callback("log", f"El usuario ingresado '{clean_username}' no existe.")
-            else:
-                callback("log", f"Error al obtener perfil para {clean_username}: {error_message}. Añadiendo datos no disponibles.")
-            
-            placeholder_info = {
-                "Nombre de usuario": clean_username,
-                "Nombre completo": 'No Disponible', "Biografía": 'No Disponible', "País": 'No Disponible',
-                "URL Perfil": f"https://www.instagram.com/{clean_username}", "Categoría": 'No Disponible',
-                "cantidad seguidores": 'No Disponible', "cantidad seguidos": 'No Disponible', "cantidad de publicaciones": 'No Disponible',
-                "Está verificado ✅": 'No Disponible', "¿Es una cuenta profesional?": 'No Disponible', "Tiene Historias Destacadas": 'No Disponible',
-                "URL Externa (Bio)": 'No Disponible', "Email Público": 'No Disponible', "Teléfono Público": 'No Disponible',
-                "Tiene Contacto Público": 'No Disponible', "Biografía con Links": 'No Disponible', "Es Cuenta Privada": 'No Disponible',
-                "Posts para promedio": 0, # No hay posts disponibles
-                "Me gusta promedio 👍": 'No Disponible', "Comentarios promedio 💬": 'No Disponible',
-                "Tasa de interacción 📊": 'No Disponible', "Últimos X Posts": [],
-                "Error al obtener perfil": error_message
+            callback("log", f"Error al obtener perfil para {clean_username}: {error_message}. Añadiendo datos no disponibles.")
+        return AccountRecord.placeholder(clean_username, profile_error=error_message)
+
+    account_info = fetch_user_media(user_profile, clean_username, posts_to_fetch, force_refresh=force_refresh, since=since,
+                                    cancel_event=cancel_event)
+    if isinstance(account_info, AccountRecord):
+        callback("log", f"Datos completos obtenidos para {clean_username}.")
+        return account_info
+    if account_info.get("error") == "Cancelled":
+        return None
+
+    media_error = account_info.get("message", "Error desconocido al obtener medios")
+    callback("log", f"Error o datos incompletos para {clean_username}: {media_error}. Añadiendo datos parciales.")
+    return AccountRecord.placeholder(clean_username, profile=user_profile, media_error=media_error)
+
+def scrape_instagram_profiles(usernames_list, posts_to_fetch, callback, max_workers=None, force_refresh=False, job_id=None,
+                              output_stream=None, collect_results=True, cancel_event=None, since=None, record_history=True,
+                              media_downloader=None, raw_stream=False):
+    """Función principal de scraping que reporta el progreso a la GUI.
+
+    posts_to_fetch es la ventana de posts por cuenta (None = sin límite) y since, opcional, la fecha
+    desde la que se analizan posts (ver fetch_user_media).
+
+    Con job_id, cada cuenta terminada se guarda en un diario y al relanzar el mismo trabajo
+    solo se analizan las cuentas pendientes.
+
+    Con output_stream (ruta de un archivo NDJSON), cada cuenta se escribe en cuanto terminan ella y
+    las anteriores de la lista, de modo que el archivo respeta el orden de entrada. Si además
+    collect_results es False, las cuentas no se acumulan en memoria y el resultado es un
+    ResultStream sobre ese archivo. Con raw_stream, las líneas son AccountRecord.to_raw (tipos nativos,
+    sin etiquetas ni redondeos) y el ResultStream devuelve AccountRecord.
+
+    La lista se normaliza antes de empezar (URLs de perfil, '@', mayúsculas) y los duplicados se
+    analizan una sola vez, así que el resultado sigue el orden de primera aparición de cada usuario.
+
+    Cada cuenta terminada se notifica con callback("account", AccountRecord) en orden de finalización.
+    Si cancel_event (threading.Event) se activa, no se envían más peticiones (ni reintentos): las cuentas
+    en curso solo esperan la petición que tienen en vuelo y se descartan, y el resultado contiene solo
+    las cuentas completadas. Las cuentas descartadas no entran en el diario, así que relanzar el mismo
+    job_id las retoma. Un Ctrl-C (KeyboardInterrupt) cancela igual: las cuentas en cola no llegan a
+    empezar y la excepción se propaga cuando terminan las que están en curso.
+
+    Con record_history, cada cuenta analizada en esta ejecución se guarda como snapshot en
+    snapshot_store (las retomadas de un diario ya se guardaron en su ejecución).
+
+    Con media_downloader (MediaDownloader), los medios de cada cuenta se entregan para descargarse
+    sin frenar el análisis; quien lo creó lo cierra después para esperar las descargas pendientes.
+    """
+    usernames_list, duplicates, invalid = normalize_usernames(usernames_list)
+    if duplicates or invalid:
+        callback("log", f"Entrada normalizada: {len(usernames_list)} usuarios únicos "
+                        f"({duplicates} duplicados y {len(invalid)} entradas no válidas descartadas).")
+    if invalid:
+        callback("log", f"Entradas no válidas: {', '.join(invalid[:10])}{'...' if len(invalid) > 10 else ''}")
+
+    workers = max(1, min(max_workers or MAX_WORKERS, len(usernames_list) or 1))
+    total = len(usernames_list)
+    all_accounts_data = [None] * total
+    client = get_client()
+    stats_before = client.connection_stats()
+    usage_before = {usage["name"]: usage for usage in client.credential_usage()}
+    cache_hits_before = response_cache.hits
+    coalesced_before = inflight_requests.coalesced
+    totals_before = metrics.totals()
+
+    journal = CheckpointJournal(job_id) if job_id else None
+    completed = journal.load() if journal else {}
+    pending = []
+    for i, username in enumerate(usernames_list):
+        done = completed.get(canonical_username(username))
+        if done is not None:
+            all_accounts_data[i] = done
+        else:
+            pending.append(i)
+    if completed:
+        callback("log", f"Reanudando trabajo '{job_id}': {total - len(pending)} cuentas ya completadas, {len(pending)} pendientes.")
+
+    run_id = snapshot_store.start_run() if record_history else None
+    stream = NDJSONWriter(output_stream) if output_stream else None
+    serialize = AccountRecord.to_raw if raw_stream else AccountRecord.to_dict
+    collect_results = collect_results or stream is None
+    # Cuentas terminadas fuera de orden que esperan a las anteriores antes de ir al stream
+    stream_buffer = {i: account_info for i, account_info in enumerate(all_accounts_data) if account_info is not None}
+    next_to_stream = 0
+
+    def flush_stream():
+        nonlocal next_to_stream
+        while next_to_stream in stream_buffer:
+            stream.write(serialize(stream_buffer.pop(next_to_stream)))
+            next_to_stream += 1
+
+    if stream:
+        flush_stream()
+    if not collect_results:
+        all_accounts_data = None
+    
+    skipped = 0
+    cancel_event = cancel_event or Event()
+    # Las peticiones quedan limitadas por el limitador de cada credencial; los hilos solo solapan la espera de red
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        try:
+            futures = {
+                executor.submit(_scrape_single_account, usernames_list[i], posts_to_fetch, callback, i + 1, total, force_refresh,
+                                cancel_event, since): i
+                for i in pending
             }
-            all_accounts_data.append(placeholder_info)
-            
-        time.sleep(2) 
+            for future in as_completed(futures):
+                account_info = future.result()
+                if account_info is None:
+                    skipped += 1
+                    continue
+                callback("account", account_info)
+                snapshot_store.record(run_id, account_info)
+                if stream:
+                    stream_buffer[futures[future]] = account_info
+                    flush_stream()
+                if collect_results:
+                    all_accounts_data[futures[future]] = account_info
+                if journal and is_final_result(account_info):
+                    journal.append(canonical_username(usernames_list[futures[future]]), account_info)
+                # Después del stream y del diario: los medios nunca retrasan que la cuenta quede guardada
+                if media_downloader is not None:
+                    media_downloader.submit(account_info)
+        except BaseException as e:
+            # Sin esto, salir del pool esperaría a que se analizara toda la cola aunque nadie recoja ya los resultados
+            if isinstance(e, KeyboardInterrupt):
+                cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+        if stream and stream_buffer:
+            # Las cuentas canceladas dejan huecos: el resto se escribe en su orden relativo
+            for i in sorted(stream_buffer):
+                stream.write(serialize(stream_buffer.pop(i)))
+    finally:
+        history_accounts = snapshot_store.finish_run(run_id)
+        if journal:
+            journal.close()
+        if stream:
+            stream.close()
+
+    if not collect_results:
+        all_accounts_data = ResultStream(output_stream, raw=raw_stream)
+    elif skipped:
+        all_accounts_data = [account_info for account_info in all_accounts_data if account_info is not None]
+
+    stats_after = client.connection_stats()
+    opened = stats_after["opened"] - stats_before["opened"]
+    sent = stats_after["requests"] - stats_before["requests"]
+    retries = stats_after["retries"] - stats_before["retries"]
 
     callback("results", all_accounts_data)
-    callback("log", "Scraping completado.")
+    callback("log", f"Conexiones HTTP: {max(sent - opened, 0)} reutilizadas, {opened} abiertas ({sent} peticiones, {retries} reintentos).")
+    for usage in client.credential_usage():
+        before = usage_before.get(usage["name"], {})
+        callback("log", f"Credencial {usage['name']}: {usage['requests'] - before.get('requests', 0)} peticiones, "
+                        f"{usage['throttled'] - before.get('throttled', 0)} respuestas 429, "
+                        f"{usage['unauthorized'] - before.get('unauthorized', 0)} respuestas 401, "
+                        f"estado {usage['state']}, ritmo {usage['rate']:.2f} peticiones/s.")
+    totals = {name: value - totals_before.get(name, 0) for name, value in metrics.totals().items()}
+    callback("log", f"Tiempo acumulado entre hilos: red {totals.get('http_request_duration_seconds', 0):.1f} s, "
+                    f"espera del limitador {totals.get('rate_limit_wait_seconds_total', 0):.1f} s, "
+                    f"backoff {totals.get('backoff_seconds_total', 0):.1f} s, "
+                    f"parseo JSON {totals.get('json_parse_seconds', 0):.2f} s.")
+    if inflight_requests.coalesced > coalesced_before:
+        callback("log", f"Peticiones agrupadas: {inflight_requests.coalesced - coalesced_before} descargas compartidas con otra en curso.")
+    if response_cache.enabled:
+        callback("log", f"Caché local: {response_cache.hits - cache_hits_before} respuestas reutilizadas sin tocar la red.")
+    if run_id is not None:
+        callback("log", f"Histórico: {history_accounts} cuentas guardadas en {snapshot_store.path} (ejecución {run_id}).")
+    if skipped:
+        callback("log", f"Scraping cancelado: {skipped} cuentas quedaron sin analizar.")
+    else:
+        callback("log", "Scraping completado.")
     return all_accounts_data
 
-def export_to_excel_with_pivot_and_charts(data, filepath):
-    if not data:
-        return False
+# --- COLA DE TRABAJO COMPARTIDA ---
+# WorkQueue define el broker; SQLiteWorkQueue lo implementa para procesos de un mismo equipo
+
+# Cada worker reclama lotes de este múltiplo de sus hilos, para que el pool no se quede sin trabajo
+WORK_QUEUE_BATCH_FACTOR = 4
+WORK_QUEUE_POLL_SECONDS = 2.0
+WORK_QUEUE_RESULTS_CHUNK = 1000
+
+class WorkQueue:
+    """Broker de la cola de usuarios: lo único que run_worker y la línea de comandos necesitan de él.
+
+    Cada worker reclama lotes con un lease de lease_seconds y lo renueva con heartbeat() mientras
+    trabaja; si el proceso muere, el lease caduca y otro worker recupera esos usuarios. Los resultados
+    se entregan a la cola con finish(). Para repartir el trabajo entre varias máquinas basta con
+    implementar estos métodos sobre un broker de red (Redis, una base de datos de servidor, SQS...).
+    """
+
+    lease_seconds = WORK_QUEUE_LEASE_SECONDS
+
+    def enqueue(self, usernames):
+        """Añade usuarios (ya normalizados) y devuelve cuántos eran nuevos."""
+        raise NotImplementedError
+
+    def claim(self, worker_id, count):
+        """Reclama hasta count usuarios pendientes para worker_id y devuelve sus nombres."""
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id):
+        """Renueva los leases de worker_id y devuelve cuántos sigue teniendo."""
+        raise NotImplementedError
+
+    def finish(self, account_info, worker_id):
+        """Guarda el AccountRecord de una cuenta que worker_id tiene reclamada.
+
+        Devuelve False si el lease ya no es suyo (caducó y otro worker recuperó la cuenta).
+        """
+        raise NotImplementedError
+
+    def release(self, worker_id):
+        """Devuelve a la cola los usuarios que worker_id reclamó y no llegó a analizar."""
+        raise NotImplementedError
+
+    def status(self):
+        """Diccionario con los usuarios en cada estado: pending, leased, done, failed y expired_leases."""
+        raise NotImplementedError
+
+    def is_drained(self):
+        """True cuando no queda nada pendiente ni en curso."""
+        status = self.status()
+        return status["pending"] == 0 and status["leased"] == 0
+
+    def results(self):
+        """AccountRecord de los usuarios terminados, en orden de encolado."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class SQLiteWorkQueue(WorkQueue):
+    """Cola en un archivo SQLite que comparten varios procesos del mismo equipo.
+
+    Solo sirve en un único equipo: el modo WAL necesita memoria compartida entre los procesos y los
+    bloqueos de SQLite no son fiables sobre sistemas de archivos de red (NFS, SMB), así que el archivo
+    no debe compartirse entre máquinas. Un usuario sin resultado definitivo (ver is_final_result) tras
+    max_attempts leases queda como fallido con su último resultado parcial.
+    """
+
+    def __init__(self, path, lease_seconds=WORK_QUEUE_LEASE_SECONDS, max_attempts=WORK_QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = Lock()
+        self._conn = open_sqlite(path)
+        # Otros procesos escriben en el mismo archivo: se espera a que suelten el bloqueo en lugar de fallar
+        self._conn.execute("PRAGMA busy_timeout = 30000")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE, "
+                "state TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+                "lease_owner TEXT, lease_expires REAL, enqueued_at REAL NOT NULL, finished_at REAL, "
+                "result TEXT, error TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, lease_expires)")
+
+    def enqueue(self, usernames):
+        """Los usuarios que ya están en la cola no se tocan."""
+        now = time.time()
+        with self._lock, self._conn as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO jobs (username, enqueued_at) VALUES (?, ?)",
+                             ((username, now) for username in usernames))
+            return conn.total_changes - before
+
+    def reclaim_expired(self, now=None):
+        """Devuelve a la cola los leases caducados (o da por fallidos los que agotaron sus intentos)."""
+        now = now or time.time()
+        with self._lock, self._conn as conn:
+            return self._reclaim_expired(conn, now)
+
+    def _reclaim_expired(self, conn, now):
+        failed = conn.execute(
+            "UPDATE jobs SET state = 'failed', lease_owner = NULL, lease_expires = NULL, finished_at = ?, "
+            "error = COALESCE(error, 'Lease caducado sin resultado') "
+            "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        ).rowcount
+        reclaimed = conn.execute(
+            "UPDATE jobs SET state = 'pending', lease_owner = NULL, lease_expires = NULL "
+            "WHERE state = 'leased' AND lease_expires < ?",
+            (now,),
+        ).rowcount
+        return failed + reclaimed
+
+    def claim(self, worker_id, count):
+        now = time.time()
+        with self._lock, self._conn as conn:
+            self._reclaim_expired(conn, now)
+            # Un único UPDATE ... RETURNING: dos workers nunca reciben el mismo usuario
+            rows = conn.execute(
+                "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id IN (SELECT id FROM jobs WHERE state = 'pending' ORDER BY id LIMIT ?) RETURNING id, username",
+                (worker_id, now + self.lease_seconds, count),
+            ).fetchall()
+        return [username for _, username in sorted(rows)]
+
+    def heartbeat(self, worker_id):
+        with self._lock, self._conn as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE state = 'leased' AND lease_owner = ?",
+                (time.time() + self.lease_seconds, worker_id),
+            ).rowcount
+
+    def finish(self, account_info, worker_id):
+        """Terminada si el resultado es definitivo; si no, vuelve a la cola mientras queden intentos."""
+        final = is_final_result(account_info)
+        error = account_info.profile_error if account_info.profile_error is not None else account_info.media_error
+        with self._lock, self._conn as conn:
+            # Solo el dueño actual del lease: un worker con el lease caducado no pisa al que recuperó la cuenta
+            return conn.execute(
+                "UPDATE jobs SET state = CASE WHEN ? THEN 'done' WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "result = ?, error = ?, lease_owner = NULL, lease_expires = NULL, finished_at = ? "
+                "WHERE username = ? AND state = 'leased' AND lease_owner = ?",
+                (final, self.max_attempts, json.dumps(account_info.to_raw(), ensure_ascii=False, separators=(',', ':')),
+                 error, time.time(), account_info.username, worker_id),
+            ).rowcount > 0
+
+    def release(self, worker_id):
+        """Los usuarios devueltos no gastan intento."""
+        with self._lock, self._conn as conn:
+            return conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL, lease_expires = NULL "
+                "WHERE state = 'leased' AND lease_owner = ?",
+                (worker_id,),
+            ).rowcount
+
+    def status(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            expired = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'leased' AND lease_expires < ?",
+                                         (time.time(),)).fetchone()[0]
+        status = {state: counts.get(state, 0) for state in ('pending', 'leased', 'done', 'failed')}
+        status["expired_leases"] = expired
+        return status
+
+    def results(self):
+        """Incluye los fallidos con resultado parcial."""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, result FROM jobs WHERE id > ? AND state IN ('done', 'failed') AND result IS NOT NULL "
+                    "ORDER BY id LIMIT ?",
+                    (last_id, WORK_QUEUE_RESULTS_CHUNK),
+                ).fetchall()
+            if not rows:
+                return
+            for job_id, result in rows:
+                yield AccountRecord.from_raw(json.loads(result))
+            last_id = rows[-1][0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def run_worker(work_queue, posts_to_fetch, callback, worker_id=None, max_workers=None, batch_size=None, cancel_event=None,
+               poll_seconds=WORK_QUEUE_POLL_SECONDS, **scrape_options):
+    """Consume la cola (cualquier WorkQueue) hasta vaciarla (o hasta cancel_event) y devuelve cuántas cuentas entregó este worker.
+
+    Cada lote reclamado se analiza con scrape_instagram_profiles (scrape_options se le pasan tal cual) y
+    cada cuenta se entrega a la cola en cuanto termina. Un hilo renueva los leases cada tercio de su
+    duración; si el worker muere, solo se repiten las cuentas del lote en curso.
+    """
+    worker_id = worker_id or default_worker_id()
+    workers = max_workers or MAX_WORKERS
+    batch_size = batch_size or workers * WORK_QUEUE_BATCH_FACTOR
+    cancel_event = cancel_event or Event()
+    stop_heartbeat = Event()
+    finished = 0
+
+    def heartbeat():
+        while not stop_heartbeat.wait(work_queue.lease_seconds / 3):
+            # Un fallo puntual del broker (base bloqueada, red) no debe parar la renovación: se reintenta en la siguiente vuelta
+            try:
+                work_queue.heartbeat(worker_id)
+            except Exception as e:
+                callback("log", f"Worker {worker_id}: error al renovar los leases ({e}); se reintentará.")
 
+    def on_event(type, message):
+        nonlocal finished
+        if type == "account":
+            if work_queue.finish(message, worker_id):
+                finished += 1
+            else:
+                callback("log", f"Worker {worker_id}: el lease de {message.username} caducó; su resultado se descarta.")
+        callback(type, message)
+
+    heartbeat_thread = Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
     try:
-        df_accounts_raw = pd.DataFrame(data)
-        df_accounts = df_accounts_raw.copy()
-
-        for col in ["cantidad seguidores", "cantidad seguidos", "cantidad de publicaciones", 
-                    "Me gusta promedio 👍", "Comentarios promedio 💬", "Posts para promedio"]: # Añadido Posts para promedio
-            if col in df_accounts.columns:
-                df_accounts[col] = df_accounts[col].replace('No Disponible', np.nan)
-                df_accounts[col] = pd.to_numeric(df_accounts[col], errors='coerce').fillna(0)
-        
-        if "Tasa de interacción 📊" in df_accounts.columns:
-            df_accounts["Tasa de interacción 📊"] = df_accounts["Tasa de interacción 📊"].astype(str).str.replace('%', '').replace('No Disponible', np.nan)
-            df_accounts["Tasa de interacción 📊"] = pd.to_numeric(df_accounts["Tasa de interacción 📊"], errors='coerce').fillna(0)
-
-
-        flat_posts_data = []
-        for account in data:
-            username = account.get("Nombre de usuario", "N/A")
-            for post in account.get("Últimos X Posts", []):
-                post_copy = post.copy()
-                post_copy["Nombre de usuario"] = username
-                flat_posts_data.append(post_copy)
-        
-        df_posts = pd.DataFrame(flat_posts_data)
+        while not cancel_event.is_set():
+            usernames = work_queue.claim(worker_id, batch_size)
+            if not usernames:
+                if work_queue.is_drained():
+                    break
+                # Quedan leases de otros workers: si caducan, se recuperan en una próxima vuelta
+                cancel_event.wait(poll_seconds)
+                continue
+            callback("log", f"Worker {worker_id}: {len(usernames)} usuarios reclamados.")
+            scrape_instagram_profiles(usernames, posts_to_fetch, on_event, max_workers=workers,
+                                      cancel_event=cancel_event, **scrape_options)
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+        work_queue.release(worker_id)
+    callback("log", f"Worker {worker_id}: {finished} cuentas entregadas a la cola.")
+    return finished
+
+# Por encima de este número de posts la exportación Excel escribe en modo de memoria constante
+EXCEL_CONSTANT_MEMORY_POSTS = int(os.environ.get('SCRAPER_EXCEL_CONSTANT_MEMORY_POSTS', 20000))
+EXCEL_CHUNK_SIZE = 2000
+EXCEL_CHART_MAX_ROWS = 30
+
+# Columnas de SnapshotStore.history_rows con sus encabezados en la hoja de histórico
+HISTORY_SHEET_COLUMNS = {
+    "username": "Nombre de usuario", "ts": "Fecha", "run_id": "Ejecución",
+    "followers": "cantidad seguidores", "followers_delta": "Variación seguidores",
+    "following": "cantidad seguidos", "media_count": "cantidad de publicaciones",
+    "media_count_delta": "Publicaciones nuevas", "avg_likes": "Me gusta promedio 👍",
+    "avg_comments": "Comentarios promedio 💬", "engagement_rate": "Tasa de interacción 📊",
+    "engagement_rate_delta": "Variación tasa de interacción", "posts_per_week": "Posts por semana",
+}
+
+ACCOUNT_NUMERIC_COLUMNS = ["cantidad seguidores", "cantidad seguidos", "cantidad de publicaciones",
+                           "Me gusta promedio 👍", "Comentarios promedio 💬", "Posts para promedio",
+                           "Me gusta mediana", "Comentarios mediana", "Me gusta p90", "Posts por semana"]
+
+def _flatten_for_excel(data, pd):
+    """Normaliza cuentas y posts por bloques de cuentas, sin copiar cada post a un dict nuevo."""
+    account_frames, post_frames, chunk = [], [], []
+
+    def flush():
+        accounts = pd.DataFrame(chunk)
+        if "Últimos X Posts" in accounts.columns:
+            post_lists = accounts.pop("Últimos X Posts")
+            counts = post_lists.str.len().fillna(0).astype(int)
+            if counts.sum():
+                posts = pd.DataFrame.from_records([post for post_list in post_lists for post in post_list])
+                posts["Nombre de usuario"] = accounts["Nombre de usuario"].repeat(counts.to_numpy()).to_numpy()
+                post_frames.append(posts)
+        if "Métricas por tipo" in accounts.columns:
+            accounts["Métricas por tipo"] = accounts["Métricas por tipo"].astype(str)
+        account_frames.append(accounts)
+        chunk.clear()
+
+    for account in data:
+        chunk.append(account_as_dict(account))
+        if len(chunk) >= EXCEL_CHUNK_SIZE:
+            flush()
+    if chunk:
+        flush()
+
+    df_accounts = pd.concat(account_frames, ignore_index=True) if account_frames else pd.DataFrame()
+    df_posts = pd.concat(post_frames, ignore_index=True) if post_frames else pd.DataFrame()
+    return df_accounts, df_posts
+
+def _write_frame(worksheet, df, start_row=0, index=False):
+    """Escribe un DataFrame fila a fila (en orden, como exige el modo constant_memory)."""
+    header = list(df.index.names if index else []) + [str(col) for col in df.columns]
+    worksheet.write_row(start_row, 0, header)
+    row = start_row + 1
+    for chunk_start in range(0, len(df), EXCEL_CHUNK_SIZE):
+        chunk = df.iloc[chunk_start:chunk_start + EXCEL_CHUNK_SIZE].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        for values in chunk.itertuples(index=index, name=None):
+            if index and isinstance(values[0], tuple):
+                values = values[0] + values[1:]
+            worksheet.write_row(row, 0, values)
+            row += 1
+    return row - 1
+
+def _add_bar_chart(workbook, worksheet, sheet_name, title, category_cols, value_col, value_name, last_row, anchor):
+    chart = workbook.add_chart({'type': 'bar'})
+    chart.add_series({
+        'name': value_name,
+        'categories': [sheet_name, 2, category_cols[0], last_row, category_cols[1]],
+        'values': [sheet_name, 2, value_col, last_row, value_col],
+    })
+    chart.set_title({'name': title})
+    chart.set_legend({'none': True})
+    worksheet.insert_chart(anchor, chart, {'x_scale': 1.5, 'y_scale': 1.5})
+
+def export_to_excel_with_pivot_and_charts(data, filepath, constant_memory=None, include_history=False):
+    """Exporta cuentas, posts, resúmenes por cuenta y por tipo de post, y sus gráficos.
+
+    Con constant_memory (automático por encima de EXCEL_CONSTANT_MEMORY_POSTS posts) xlsxwriter
+    vuelca cada fila a disco al escribirla en lugar de mantener la hoja entera en memoria.
+
+    Con include_history se añade una hoja 'Histórico' con los snapshots guardados de las cuentas
+    exportadas y la variación entre ejecuciones consecutivas.
+    """
+    if not data:
+        return False
 
-        for col in ["Likes", "Comments"]:
-            if col in df_posts.columns:
-                df_posts[col] = pd.to_numeric(df_posts[col], errors='coerce').fillna(0)
+    import pandas as pd
+    import xlsxwriter
 
-        with pd.ExcelWriter(filepath, engine='xlsxwriter') as writer:
-            df_accounts.to_excel(writer, sheet_name='Datos Cuentas', index=False)
-            
-            df_posts.to_excel(writer, sheet_name='Datos Posts', index=False)
+    try:
+        # Un solo recorrido de los datos: admite listas o un ResultStream leído cuenta a cuenta
+        with metrics.timer("export_duration_seconds", format="xlsx", stage="flatten"):
+            df_accounts, df_posts = _flatten_for_excel(data, pd)
+
+        with metrics.timer("export_duration_seconds", format="xlsx", stage="coerce"):
+            for col in ACCOUNT_NUMERIC_COLUMNS:
+                if col in df_accounts.columns:
+                    df_accounts[col] = pd.to_numeric(df_accounts[col], errors='coerce').fillna(0)
+
+            if "Tasa de interacción 📊" in df_accounts.columns:
+                df_accounts["Tasa de interacción 📊"] = df_accounts["Tasa de interacción 📊"].astype(str).str.rstrip('%')
+                df_accounts["Tasa de interacción 📊"] = pd.to_numeric(df_accounts["Tasa de interacción 📊"], errors='coerce').fillna(0)
+
+            for col in ["Likes", "Comments"]:
+                if col in df_posts.columns:
+                    df_posts[col] = pd.to_numeric(df_posts[col], errors='coerce').fillna(0)
+        metrics.inc("export_rows_total", len(df_accounts), format="xlsx", table="accounts")
+        metrics.inc("export_rows_total", len(df_posts), format="xlsx", table="posts")
+        write_start = time.perf_counter()
+
+        if constant_memory is None:
+            constant_memory = len(df_posts) > EXCEL_CONSTANT_MEMORY_POSTS
+
+        workbook = xlsxwriter.Workbook(filepath, {'constant_memory': constant_memory, 'strings_to_urls': False})
+        try:
+            _write_frame(workbook.add_worksheet('Datos Cuentas'), df_accounts)
+            _write_frame(workbook.add_worksheet('Datos Posts'), df_posts)
 
-            workbook = writer.book
-            worksheet_analysis = workbook.add_worksheet('Análisis Cuentas')
+            sheet_name = 'Análisis Cuentas'
+            worksheet_analysis = workbook.add_worksheet(sheet_name)
+            worksheet_analysis.write('A1', 'Análisis de Cuentas de Instagram - Resumen de Métricas')
 
             pivot_values = ["cantidad seguidores", "cantidad de publicaciones", 
                             "Me gusta promedio 👍", "Comentarios promedio 💬", 
                             "Tasa de interacción 📊"]
-            
             actual_pivot_values = [col for col in pivot_values if col in df_accounts.columns and pd.api.types.is_numeric_dtype(df_accounts[col])]
 
             if actual_pivot_values:
-                pivot_table_accounts = pd.pivot_table(df_accounts, 
-                                                    values=actual_pivot_values, 
-                                                    index=["Nombre de usuario"],
-                                                    aggfunc=np.mean)
-                
-                pivot_table_accounts.to_excel(writer, sheet_name='Análisis Cuentas', startrow=1, startcol=0)
-                worksheet_analysis.write('A1', 'Análisis de Cuentas de Instagram - Resumen de Métricas')
+                summary_accounts = df_accounts.groupby("Nombre de usuario")[sorted(actual_pivot_values)].mean()
+                last_row = _write_frame(worksheet_analysis, summary_accounts, start_row=1, index=True)
+                if "Tasa de interacción 📊" in summary_accounts.columns and last_row >= 2:
+                    value_col = 1 + list(summary_accounts.columns).index("Tasa de interacción 📊")
+                    _add_bar_chart(workbook, worksheet_analysis, sheet_name, 'Tasa de interacción por cuenta (%)',
+                                   (0, 0), value_col, 'Tasa de interacción 📊',
+                                   min(last_row, 1 + EXCEL_CHART_MAX_ROWS), f"{xlsxwriter.utility.xl_col_to_name(len(summary_accounts.columns) + 2)}2")
 
             if not df_posts.empty:
-                worksheet_post_analysis = workbook.add_worksheet('Análisis Posts')
-                
-                pivot_table_posts = pd.pivot_table(df_posts, 
-                                                values=["Likes", "Comments"],
-                                                index=["Nombre de usuario", "Type"],
-                                                aggfunc=np.mean)
-                
-                pivot_table_posts.to_excel(writer, sheet_name='Análisis Posts', startrow=1, startcol=0)
+                sheet_name = 'Análisis Posts'
+                worksheet_post_analysis = workbook.add_worksheet(sheet_name)
                 worksheet_post_analysis.write('A1', 'Análisis de Posts de Instagram por Tipo y Usuario')
-            
-            return True
+                
+                summary_posts = df_posts.groupby(["Nombre de usuario", "Type"])[["Comments", "Likes"]].mean()
+                last_row = _write_frame(worksheet_post_analysis, summary_posts, start_row=1, index=True)
+                if last_row >= 2:
+                    _add_bar_chart(workbook, worksheet_post_analysis, sheet_name, 'Me gusta promedio por cuenta y tipo de post',
+                                   (0, 1), 3, 'Likes', min(last_row, 1 + EXCEL_CHART_MAX_ROWS), 'F2')
+
+            if include_history and snapshot_store.enabled and "Nombre de usuario" in df_accounts.columns:
+                df_history = pd.DataFrame(snapshot_store.history_rows(df_accounts["Nombre de usuario"]),
+                                          columns=list(HISTORY_SHEET_COLUMNS))
+                df_history["ts"] = df_history["ts"].map(lambda ts: datetime.fromtimestamp(ts).strftime('%d/%m/%Y %H:%M'))
+                metrics.inc("export_rows_total", len(df_history), format="xlsx", table="history")
+                _write_frame(workbook.add_worksheet('Histórico'), df_history.rename(columns=HISTORY_SHEET_COLUMNS))
+        finally:
+            workbook.close()
+            metrics.observe("export_duration_seconds", time.perf_counter() - write_start, format="xlsx", stage="write")
+        return True
 
     except Exception as e:
-        print(f"Error al exportar a Excel: {e}")
+        print(f"Error al exportar a Excel: {e}", file=sys.stderr)
         return False
 
-# --- INTERFAZ GRÁFICA ---
-
-class App(ctk.CTk):
-    def __init__(self):
-        super().__init__()
-
-        self.title("Instagram Scraper")
-        self.geometry("1000x800")
-        self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(0, weight=0)
-        self.grid_rowconfigure(1, weight=1)
-        self.grid_rowconfigure(2, weight=0)
-
-        # Frame de Entrada
-        self.input_frame = ctk.CTkFrame(self)
-        self.input_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
-        self.input_frame.grid_columnconfigure(0, weight=1)
-        self.input_frame.grid_columnconfigure(1, weight=0) 
-        self.input_frame.grid_columnconfigure(2, weight=0)
-
-
-        ctk.CTkLabel(self.input_frame, text="Nombres de Usuario de Instagram (separados por comas):").grid(row=0, column=0, padx=10, pady=10, sticky="w", columnspan=2)
-        self.usernames_entry = ctk.CTkEntry(self.input_frame, placeholder_text="ej: instagram,natgeo,cristiano", width=400)
-        self.usernames_entry.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
-
-        ctk.CTkLabel(self.input_frame, text="Posts a obtener:").grid(row=0, column=2, padx=(10,0), pady=10, sticky="w")
-        self.posts_count_combobox = ctk.CTkComboBox(self.input_frame, 
-                                                    values=["2", "5", "12", "24", "50"],
-                                                    command=self.set_posts_count)
-        self.posts_count_combobox.set("12")
-        self.posts_count_combobox.grid(row=1, column=2, padx=10, pady=10, sticky="e")
-
-        self.start_button = ctk.CTkButton(self.input_frame, text="Iniciar Análisis", command=self.start_scraping)
-        self.start_button.grid(row=1, column=1, padx=10, pady=10, sticky="e")
-
-
-        # Frame de Resultados (consola y detalles)
-        self.results_frame = ctk.CTkFrame(self)
-        self.results_frame.grid(row=1, column=0, padx=20, pady=20, sticky="nsew")
-        self.results_frame.grid_rowconfigure(0, weight=0)
-        self.results_frame.grid_rowconfigure(1, weight=1)
-        self.results_frame.grid_columnconfigure(0, weight=1)
-        
-        # Log de consola
-        self.output_log = ctk.CTkTextbox(self.results_frame, width=800, height=100, state="disabled", wrap="word")
-        self.output_log.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="nsew")
-
-        # Frame para los detalles
-        self.data_display_frame = ctk.CTkScrollableFrame(self.results_frame, label_text="Resultados del Análisis:")
-        self.data_display_frame.grid(row=1, column=0, padx=10, pady=(5, 10), sticky="nsew")
-        self.data_display_frame.grid_columnconfigure(0, weight=1)
-
-        self.detailed_results_text = ctk.CTkTextbox(self.data_display_frame, height=250, state="disabled", wrap="word")
-        self.detailed_results_text.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
-        
-        # Botones de Acción (Descargar)
-        self.action_frame = ctk.CTkFrame(self)
-        self.action_frame.grid(row=2, column=0, padx=20, pady=20, sticky="nsew")
-        self.action_frame.grid_columnconfigure((0, 1), weight=1)
-
-        self.download_json_button = ctk.CTkButton(self.action_frame, text="Descargar Resultados (JSON)", command=self.download_json)
-        self.download_json_button.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
-        self.download_json_button.configure(state="disabled")
-
-        self.download_excel_button = ctk.CTkButton(self.action_frame, text="Descargar Resultados (Excel con Tablas)", command=self.download_excel_with_charts)
-        self.download_excel_button.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
-        self.download_excel_button.configure(state="disabled")
-
-        self.scraped_data = []
-        self.selected_posts_count = int(self.posts_count_combobox.get())
-
-    def set_posts_count(self, choice):
-        try:
-            self.selected_posts_count = int(choice)
-            self.update_log(f"Cantidad de posts a obtener configurada a: {self.selected_posts_count}")
-        except ValueError:
-            self.update_log("Error: Valor inválido para cantidad de posts. Usando 12 por defecto.")
-            self.selected_posts_count = 12
-            self.posts_count_combobox.set("12")
-
-    def update_log(self, message):
-        self.output_log.configure(state="normal")
-        self.output_log.insert("end", message + "\n")
-        self.output_log.see("end")
-        self.output_log.configure(state="disabled")
-        self.update_idletasks()
-
-    def start_scraping(self):
-        usernames_input = self.usernames_entry.get().strip()
-        if not usernames_input:
-            messagebox.showwarning("Entrada Vacía", "Por favor, introduce al menos un nombre de usuario.")
-            return
-
-        usernames_list = [u.strip() for u in usernames_input.split(',') if u.strip()]
-        if not usernames_list:
-            messagebox.showwarning("Entrada Vacía", "Por favor, introduce al menos un nombre de usuario válido.")
-            return
+# --- EXPORTACIÓN COLUMNAR TIPADA (PARQUET / ARROW) ---
+
+COLUMNAR_BATCH_SIZE = 1000
+
+def _columnar_schemas(pa):
+    accounts_schema = pa.schema([
+        ("username", pa.string()),
+        ("full_name", pa.string()),
+        ("biography", pa.string()),
+        ("country", pa.string()),
+        ("profile_url", pa.string()),
+        ("category", pa.string()),
+        ("followers", pa.int64()),
+        ("following", pa.int64()),
+        ("media_count", pa.int64()),
+        ("is_verified", pa.bool_()),
+        ("is_business", pa.bool_()),
+        ("has_highlights", pa.bool_()),
+        ("external_url", pa.string()),
+        ("public_email", pa.string()),
+        ("public_phone", pa.string()),
+        ("has_public_contact", pa.bool_()),
+        ("bio_has_links", pa.bool_()),
+        ("is_private", pa.bool_()),
+        ("posts_for_average", pa.int32()),
+        ("avg_likes", pa.float64()),
+        ("avg_comments", pa.float64()),
+        ("engagement_rate_pct", pa.float64()),
+        ("likes_median", pa.float64()),
+        ("comments_median", pa.float64()),
+        ("likes_p90", pa.float64()),
+        ("posts_per_week", pa.float64()),
+        ("profile_error", pa.string()),
+        ("media_error", pa.string()),
+    ])
+    posts_schema = pa.schema([
+        ("username", pa.string()),
+        ("post_id", pa.int64()),
+        ("media_type", pa.dictionary(pa.int8(), pa.string())),
+        ("likes", pa.int64()),
+        ("comments", pa.int64()),
+        ("caption", pa.string()),
+        ("taken_at", pa.timestamp('s', tz='UTC')),
+        ("media_url", pa.string()),
+        ("is_carousel", pa.bool_()),
+    ])
+    return accounts_schema, posts_schema
+
+def _record_account_row(record):
+    return {
+        "username": record.username,
+        "full_name": record.full_name,
+        "biography": record.biography,
+        "country": None if record.country is None else str(record.country),
+        "profile_url": f"https://www.instagram.com/{record.username}",
+        "category": record.category,
+        "followers": record.followers,
+        "following": record.following,
+        "media_count": record.media_count,
+        "is_verified": record.is_verified,
+        "is_business": record.is_business,
+        "has_highlights": record.has_highlights,
+        "external_url": record.external_url,
+        "public_email": record.public_email,
+        "public_phone": record.public_phone,
+        "has_public_contact": record.has_public_contact,
+        "bio_has_links": record.bio_has_links,
+        "is_private": record.is_private,
+        "posts_for_average": record.posts_for_average,
+        "avg_likes": record.avg_likes,
+        "avg_comments": record.avg_comments,
+        "engagement_rate_pct": record.engagement_rate,
+        "likes_median": record.likes_median,
+        "comments_median": record.comments_median,
+        "likes_p90": record.likes_p90,
+        "posts_per_week": record.posts_per_week,
+        "profile_error": record.profile_error,
+        "media_error": record.media_error,
+    }
 
-        self.output_log.configure(state="normal")
-        self.output_log.delete("1.0", "end")
-        self.output_log.configure(state="disabled")
-        self.detailed_results_text.configure(state="normal")
-        self.detailed_results_text.delete("1.0", "end")
-        self.detailed_results_text.configure(state="disabled")
+def _record_post_rows(record):
+    for post in record.posts:
+        yield {
+            "username": record.username,
+            "post_id": post.pk,
+            "media_type": 'Foto' if post.media_type == 1 else ('Video' if post.media_type == 2 else 'Otro'),
+            "likes": post.likes,
+            "comments": post.comments,
+            "caption": post.caption,
+            "taken_at": post.taken_at,
+            "media_url": post.media_url,
+            "is_carousel": post.is_carousel,
+        }
+
+def columnar_posts_path(filepath):
+    root, ext = os.path.splitext(filepath)
+    return f"{root}_posts{ext}"
+
+def export_to_columnar(data, filepath, file_format=None):
+    """Exporta cuentas y posts a Parquet o Arrow IPC con un esquema tipado y nulos reales.
+
+    Las cuentas se guardan en filepath y los posts en <nombre>_posts<extensión>. Los datos se
+    recorren una vez y se escriben por lotes, así que data puede ser un ResultStream. data debe dar
+    AccountRecord (p. ej. un ResultStream con raw): los valores salen de sus tipos nativos, sin pasar
+    por las etiquetas de to_dict.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import pyarrow.ipc as ipc
+    except ImportError:
+        print("Error: la exportación Parquet/Arrow necesita pyarrow (pip install pyarrow).", file=sys.stderr)
+        return False
 
-        self.scraped_data = []
-        self.start_button.configure(state="disabled", text="Analizando...")
-        self.download_json_button.configure(state="disabled")
-        self.download_excel_button.configure(state="disabled")
+    if file_format is None:
+        file_format = 'parquet' if filepath.lower().endswith('.parquet') else 'arrow'
+    accounts_schema, posts_schema = _columnar_schemas(pa)
 
-        Thread(target=self._run_scraping_thread, args=(usernames_list, self.selected_posts_count,)).start()
+    def open_writer(path, schema):
+        if file_format == 'parquet':
+            return pq.ParquetWriter(path, schema)
+        return ipc.new_file(path, schema)
 
-    def _run_scraping_thread(self, usernames_list, posts_to_fetch):
+    try:
+        accounts_writer = open_writer(filepath, accounts_schema)
+        posts_writer = open_writer(columnar_posts_path(filepath), posts_schema)
+        write_start = time.perf_counter()
         try:
-            self.update_log("Iniciando análisis de Instagram...")
-            results = scrape_instagram_profiles(usernames_list, posts_to_fetch, self._report_progress)
-            self.scraped_data = results
-            
-            self.after(0, self._display_final_results, results)
-        except Exception as e:
-            self.after(0, lambda: messagebox.showerror("Error de Scraping", f"Ocurrió un error inesperado: {e}"))
-            self.update_log(f"Error fatal: {e}")
+            account_rows, post_rows = [], []
+            accounts_written = posts_written = 0
+            for account in data:
+                account_rows.append(_record_account_row(account))
+                pending_posts = len(post_rows)
+                post_rows.extend(_record_post_rows(account))
+                accounts_written += 1
+                posts_written += len(post_rows) - pending_posts
+                if len(account_rows) >= COLUMNAR_BATCH_SIZE:
+                    accounts_writer.write_table(pa.Table.from_pylist(account_rows, schema=accounts_schema))
+                    account_rows = []
+                if len(post_rows) >= COLUMNAR_BATCH_SIZE:
+                    posts_writer.write_table(pa.Table.from_pylist(post_rows, schema=posts_schema))
+                    post_rows = []
+            if account_rows:
+                accounts_writer.write_table(pa.Table.from_pylist(account_rows, schema=accounts_schema))
+            if post_rows:
+                posts_writer.write_table(pa.Table.from_pylist(post_rows, schema=posts_schema))
+            metrics.inc("export_rows_total", accounts_written, format=file_format, table="accounts")
+            metrics.inc("export_rows_total", posts_written, format=file_format, table="posts")
         finally:
-            self.after(0, lambda: self.start_button.configure(state="normal", text="Iniciar Análisis"))
-            self.after(0, lambda: self.download_json_button.configure(state="normal" if self.scraped_data else "disabled"))
-            self.after(0, lambda: self.download_excel_button.configure(state="normal" if self.scraped_data else "disabled"))
-
-    def _report_progress(self, type, message):
-        if type == "log":
-            self.update_log(message)
-        elif type == "results":
-            pass
-
-    def _display_final_results(self, results):
-        if not results:
-            self.update_log("No se pudieron obtener datos para ningún usuario.")
-            return
-
-        detailed_output = ""
-        for user in results:
-            if user.get("Error al obtener perfil") == "Usuario no encontrado":
-                detailed_output += f"--- {user.get('Nombre de usuario', 'Usuario Desconocido')} ---\n"
-                detailed_output += "El usuario ingresado no existe.\n\n"
-                continue
-                
-            detailed_output += f"--- {user.get('Nombre de usuario', 'Usuario Desconocido')} ---\n"
-            detailed_output += f"Nombre completo: {user.get('Nombre completo', 'N/A')}\n"
-            detailed_output += f"Biografía: {user.get('Biografía', 'N/A')}\n"
-            detailed_output += f"País: {user.get('País', 'N/A')}\n"
-            detailed_output += f"cantidad seguidores: {user.get('cantidad seguidores', 'N/A')}\n"
-            detailed_output += f"cantidad seguidos: {user.get('cantidad seguidos', 'N/A')}\n"
-            detailed_output += f"cantidad de publicaciones: {user.get('cantidad de publicaciones', 'N/A')}\n"
-            detailed_output += f"Está verificado ✅: {user.get('Está verificado ✅', 'N/A')}\n"
-            detailed_output += f"¿Es una cuenta profesional?: {user.get('¿Es una cuenta profesional?', 'N/A')}\n"
-            
-            # --- CAMBIO AQUÍ: Añadir la línea del promedio de posts ---
-            posts_for_avg = user.get('Posts para promedio', 'N/A')
-            if posts_for_avg != 'N/A' and posts_for_avg > 0:
-                detailed_output += f"----- Promedio de los últimos {posts_for_avg} posts -----\n"
-            else:
-                detailed_output += f"----- Promedio de posts (No Disponible) -----\n"
-
-            detailed_output += f"Me gusta promedio 👍: {user.get('Me gusta promedio 👍', 'N/A')}\n"
-            detailed_output += f"Comentarios promedio 💬: {user.get('Comentarios promedio 💬', 'N/A')}\n"
-            detailed_output += f"Tasa de interacción 📊: {user.get('Tasa de interacción 📊', 'N/A')}\n"
-
-            if "Error al obtener perfil" in user and user.get("Error al obtener perfil") != "Usuario no encontrado":
-                detailed_output += f"Error al obtener perfil: {user.get('Error al obtener perfil', 'N/A')}\n"
-            if "Error al obtener medios" in user:
-                detailed_output += f"Error al obtener medios: {user.get('Error al obtener medios', 'N/A')}\n"
-
-            detailed_output += "\n"
-
-        self.detailed_results_text.configure(state="normal")
-        self.detailed_results_text.delete("1.0", "end")
-        self.detailed_results_text.insert("end", detailed_output)
-        self.detailed_results_text.configure(state="disabled")
-
-
-    def download_json(self):
-        if not self.scraped_data:
-            messagebox.showwarning("No hay datos", "No hay datos para descargar. Realiza un scraping primero.")
-            return
-        
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json")],
-            initialfile="instagram_user_data_latest.json"
-        )
-        if file_path:
-            try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.scraped_data, f, indent=4, ensure_ascii=False)
-                messagebox.showinfo("Descarga Exitosa", f"Datos guardados en:\n{file_path}")
-            except Exception as e:
-                messagebox.showerror("Error al guardar JSON", f"No se pudo guardar el archivo JSON:\n{e}")
+            accounts_writer.close()
+            posts_writer.close()
+            metrics.observe("export_duration_seconds", time.perf_counter() - write_start, format=file_format, stage="write")
+        return True
+    except Exception as e:
+        print(f"Error al exportar a {file_format}: {e}", file=sys.stderr)
+        return False
 
-    def download_excel_with_charts(self):
-        if not self.scraped_data:
-            messagebox.showwarning("No hay datos", "No hay datos para descargar. Realiza un scraping primero.")
-            return
+# --- MODO POR LÍNEA DE COMANDOS ---
+
+def read_usernames(source):
+    """Lee usuarios separados por comas o saltos de línea desde un archivo o stdin ('-')."""
+    if source == '-':
+        text = sys.stdin.read()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            text = f.read()
+    return split_usernames(text)
+
+def write_json(data, filepath):
+    """Escribe una lista JSON con indent=4 elemento a elemento, para no serializar todo de una vez."""
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('[')
+        count = 0
+        for item in data:
+            f.write(',\n    ' if count else '\n    ')
+            f.write(json.dumps(account_as_dict(item), indent=4, ensure_ascii=False).replace('\n', '\n    '))
+            count += 1
+        f.write('\n]' if count else ']')
+
+def write_results(results, filepath, include_history=False):
+    """Guarda los resultados según la extensión de filepath (JSON por stdout sin ruta); devuelve el código de salida."""
+    output = filepath.lower() if filepath else ''
+    if not filepath:
+        json.dump([account_as_dict(account) for account in results], sys.stdout, indent=4, ensure_ascii=False)
+        sys.stdout.write('\n')
+    elif output.endswith(('.ndjson', '.jsonl')):
+        with NDJSONWriter(filepath) as writer:
+            for account in results:
+                writer.write(account_as_dict(account))
+    elif output.endswith('.xlsx'):
+        if not export_to_excel_with_pivot_and_charts(results, filepath, include_history=include_history):
+            print("Error: no se pudo guardar el archivo Excel.", file=sys.stderr)
+            return 1
+    elif output.endswith(('.parquet', '.arrow', '.feather')):
+        if not export_to_columnar(results, filepath):
+            print("Error: no se pudo guardar la exportación columnar.", file=sys.stderr)
+            return 1
+    else:
+        write_json(results, filepath)
+    return 0
+
+def parse_since_date(value):
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida '{value}', usa el formato AAAA-MM-DD")
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Analiza perfiles de Instagram. Sin argumentos abre la interfaz gráfica."
+    )
+    parser.add_argument('-i', '--input', help="Archivo con usuarios (uno por línea o separados por comas); '-' para stdin.")
+    parser.add_argument('-u', '--usernames', help="Usuarios separados por comas.")
+    parser.add_argument('-o', '--output', help="Ruta de salida: .json, .ndjson, .xlsx, .parquet o .arrow "
+                                               "(por defecto JSON por stdout).")
+    parser.add_argument('-p', '--posts', type=int, default=None,
+                        help="Posts a obtener por cuenta (0 = solo perfil; por defecto 12, o todos los posteriores a --since).")
+    parser.add_argument('--since', type=parse_since_date, help="Solo posts publicados desde esta fecha (AAAA-MM-DD).")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Perfiles analizados en paralelo.")
+    parser.add_argument('--force-refresh', action='store_true', help="Ignora la caché local.")
+    parser.add_argument('--job-id', help="Identificador de trabajo reanudable.")
+    parser.add_argument('--no-history', action='store_true', help="No guarda esta ejecución en el histórico de snapshots.")
+    parser.add_argument('--history-sheet', action='store_true', help="Añade al Excel una hoja con el histórico de las cuentas.")
+    parser.add_argument('--history-report', nargs='?', const='followers', metavar='METRICA',
+                        help="No analiza nada: imprime en JSON crecimiento, tendencia de la métrica (por defecto followers) "
+                             "y velocidad de likes a partir del histórico (desde --since, si se indica).")
+    parser.add_argument('--download-media', nargs='?', const=MEDIA_DIR, metavar='CARPETA',
+                        help=f"Descarga fotos y vídeos de los posts (carruseles incluidos) en CARPETA (por defecto {MEDIA_DIR}).")
+    parser.add_argument('--media-resolution', type=parse_media_resolution, default='max',
+                        help="Resolución a descargar: max, min o un ancho en píxeles (por defecto max).")
+    parser.add_argument('--queue', metavar='DB', help="Cola SQLite compartida entre procesos del mismo equipo (con --enqueue, "
+                                                       "--worker, --collect o --queue-status).")
+    parser.add_argument('--enqueue', action='store_true', help="Añade a la cola los usuarios de --input/--usernames.")
+    parser.add_argument('--worker', action='store_true', help="Analiza usuarios de la cola hasta vaciarla.")
+    parser.add_argument('--worker-id', help="Identificador del worker en los leases (por defecto host-pid).")
+    parser.add_argument('--lease-seconds', type=float, default=WORK_QUEUE_LEASE_SECONDS,
+                        help="Duración de cada lease; un worker que no lo renueva a tiempo pierde sus usuarios.")
+    parser.add_argument('--collect', action='store_true', help="Exporta a --output los resultados guardados en la cola.")
+    parser.add_argument('--queue-status', action='store_true', help="Imprime en JSON el estado de la cola.")
+    parser.add_argument('--metrics-out', help="Guarda las métricas al terminar: .prom/.txt (Prometheus) o .json (resumen).")
+    parser.add_argument('--metrics-port', type=int, help="Sirve /metrics y /metrics.json en este puerto durante el análisis.")
+    parser.add_argument('--gui', action='store_true', help="Abre la interfaz gráfica.")
+    return parser
+
+def history_report(usernames, metric='followers', since=None, top_posts=10):
+    """Informe del histórico sin hacer scraping: sin usuarios, abarca todas las cuentas guardadas."""
+    trends = snapshot_store.trends(metric, since, usernames or None)
+    usernames = usernames or [trend["username"] for trend in trends]
+    return {
+        "metric": metric,
+        "trends": trends,
+        "growth": [growth for growth in (snapshot_store.growth(username, since) for username in usernames) if growth],
+        "like_velocity": {username: snapshot_store.like_velocity(username, since)[:top_posts] for username in usernames},
+    }
 
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx")],
-            initialfile="instagram_user_data_analysis.xlsx"
-        )
-        if file_path:
-            try:
-                success = export_to_excel_with_pivot_and_charts(self.scraped_data, file_path)
-                if success:
-                    messagebox.showinfo("Descarga Exitosa", f"Datos con tablas guardados en:\n{file_path}")
-                else:
-                    messagebox.showerror("Error al guardar Excel", "No se pudo guardar el archivo Excel. Revisa el log para más detalles.")
-            except Exception as e:
-                messagebox.showerror("Error al guardar Excel", f"Ocurrió un error al intentar guardar el archivo Excel:\n{e}")
+def _log_to_stderr(type, message):
+    if type == "log":
+        print(message, file=sys.stderr, flush=True)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_arg_parser().parse_args(argv)
+
+    if args.gui or not argv:
+        from InstagramScrapGUI import run_gui
+        run_gui()
+        return 0
+
+    usernames_list = []
+    if args.input:
+        usernames_list.extend(read_usernames(args.input))
+    if args.usernames:
+        usernames_list.extend(split_usernames(args.usernames))
+    if args.history_report:
+        if not snapshot_store.enabled:
+            print("Error: el histórico está desactivado (SCRAPER_HISTORY_DB vacío).", file=sys.stderr)
+            return 2
+        try:
+            report = history_report(normalize_usernames(usernames_list)[0], args.history_report, args.since)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4, ensure_ascii=False)
+        else:
+            json.dump(report, sys.stdout, indent=4, ensure_ascii=False)
+            sys.stdout.write('\n')
+        return 0
+
+    work_queue = SQLiteWorkQueue(args.queue, lease_seconds=args.lease_seconds) if args.queue else None
+    if work_queue is not None:
+        if not (args.enqueue or args.worker or args.collect or args.queue_status):
+            print("Error: con --queue indica --enqueue, --worker, --collect o --queue-status.", file=sys.stderr)
+            return 2
+        if args.enqueue:
+            usernames, duplicates, invalid = normalize_usernames(usernames_list)
+            if not usernames:
+                print("Error: introduce al menos un nombre de usuario para encolar (--input o --usernames).", file=sys.stderr)
+                return 2
+            added = work_queue.enqueue(usernames)
+            print(f"Cola {args.queue}: {added} usuarios encolados ({len(usernames) - added} ya estaban, "
+                  f"{duplicates} duplicados y {len(invalid)} entradas no válidas descartadas).", file=sys.stderr)
+    elif not usernames_list:
+        print("Error: introduce al menos un nombre de usuario (--input o --usernames).", file=sys.stderr)
+        return 2
+
+    if work_queue is None or args.worker:
+        exit_code = _run_scrape(args, usernames_list, work_queue)
+        if exit_code or work_queue is None:
+            return exit_code
+
+    if args.queue_status:
+        json.dump(work_queue.status(), sys.stdout, indent=4)
+        sys.stdout.write('\n')
+    if args.collect:
+        return write_results(work_queue.results(), args.output, args.history_sheet)
+    return 0
+
+def _run_scrape(args, usernames_list, work_queue=None):
+    """Análisis por línea de comandos: de la lista de usuarios o, con work_queue, como worker de la cola."""
+    output = args.output.lower() if args.output and work_queue is None else ''
+    # Salvo para stdout, los resultados se vuelcan en NDJSON a medida que terminan las cuentas
+    if output.endswith(('.ndjson', '.jsonl')):
+        stream_path = args.output
+    elif output:
+        stream_path = args.output + '.partial.ndjson'
+    else:
+        stream_path = None
+    # Parquet/Arrow se escriben desde los tipos nativos: el stream guarda AccountRecord.to_raw, no las etiquetas
+    raw_stream = output.endswith(('.parquet', '.arrow', '.feather'))
+
+    if args.metrics_port is not None:
+        metrics_server = start_metrics_server(args.metrics_port)
+        print(f"Métricas en http://127.0.0.1:{metrics_server.server_address[1]}/metrics", file=sys.stderr)
+
+    media_downloader = MediaDownloader(args.download_media, args.media_resolution) if args.download_media else None
+    try:
+        posts_to_fetch = args.posts if args.posts is not None or args.since else 12
+        scrape_options = dict(force_refresh=args.force_refresh, since=args.since, record_history=not args.no_history,
+                              media_downloader=media_downloader)
+        if work_queue is not None:
+            run_worker(work_queue, posts_to_fetch, _log_to_stderr, worker_id=args.worker_id, max_workers=args.workers,
+                       **scrape_options)
+            results = None
+        else:
+            results = scrape_instagram_profiles(usernames_list, posts_to_fetch, _log_to_stderr,
+                                                max_workers=args.workers, job_id=args.job_id, output_stream=stream_path,
+                                                collect_results=stream_path is None, raw_stream=raw_stream, **scrape_options)
+    except MissingCredentialsError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Interrumpido." + (f" Relanza con --job-id {args.job_id} para retomar las cuentas pendientes."
+                                 if args.job_id else ""), file=sys.stderr)
+        return 130
+    finally:
+        if media_downloader is not None:
+            stats = media_downloader.close()
+            print(f"Medios: {stats['downloaded']} descargados ({stats['bytes'] / 1024 / 1024:.1f} MiB), "
+                  f"{stats['deduplicated']} con contenido ya guardado, {stats['already_stored']} ya descargados antes, "
+                  f"{stats['failed']} con error.", file=sys.stderr)
+    if args.metrics_out:
+        metrics.write(args.metrics_out)
+
+    # Con -o .ndjson el stream ya es la salida; sin -o los resultados van a stdout con write_results
+    if results is None or (stream_path is not None and stream_path == args.output):
+        return 0
+    exit_code = write_results(results, args.output, args.history_sheet)
+    if stream_path and not exit_code:
+        os.remove(stream_path)
+    return exit_code
 
 if __name__ == "__main__":
-    app = App()
-    app.mainloop()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
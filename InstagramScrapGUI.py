@@ -0,0 +1,364 @@
+import os
+import queue
+import tempfile
+from datetime import datetime
+from threading import Event, Thread
+from tkinter import filedialog, messagebox
+
+import customtkinter as ctk
+
+from InstagramScrap import (scrape_instagram_profiles, export_to_excel_with_pivot_and_charts, write_json, account_as_dict,
+                            NDJSONWriter, ResultStream, split_usernames, refresh_credentials)
+
+# --- INTERFAZ GRÁFICA ---
+
+# El log se vuelca en bloque cada LOG_FLUSH_INTERVAL_MS y conserva como mucho LOG_MAX_LINES líneas
+LOG_FLUSH_INTERVAL_MS = 100
+LOG_MAX_LINES = 2000
+# Cuentas mostradas por página en el panel de resultados
+RESULTS_PAGE_SIZE = 25
+
+class App(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+
+        self.title("Instagram Scraper")
+        self.geometry("1000x800")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=0)
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_rowconfigure(2, weight=0)
+
+        # Frame de Entrada
+        self.input_frame = ctk.CTkFrame(self)
+        self.input_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
+        self.input_frame.grid_columnconfigure(0, weight=1)
+        self.input_frame.grid_columnconfigure(1, weight=0) 
+        self.input_frame.grid_columnconfigure(2, weight=0)
+
+
+        ctk.CTkLabel(self.input_frame, text="Nombres de Usuario o URLs de perfil de Instagram (separados por comas):").grid(row=0, column=0, padx=10, pady=10, sticky="w", columnspan=2)
+        self.usernames_entry = ctk.CTkEntry(self.input_frame, placeholder_text="ej: instagram,natgeo,cristiano", width=400)
+        self.usernames_entry.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
+
+        ctk.CTkLabel(self.input_frame, text="Posts a obtener:").grid(row=0, column=2, padx=(10,0), pady=10, sticky="w")
+        self.posts_count_combobox = ctk.CTkComboBox(self.input_frame, 
+                                                    values=["2", "5", "12", "24", "50", "100", "200", "500", "1000", "Todos"],
+                                                    command=self.set_posts_count)
+        self.posts_count_combobox.set("12")
+        self.posts_count_combobox.grid(row=1, column=2, padx=10, pady=10, sticky="e")
+
+        self.start_button = ctk.CTkButton(self.input_frame, text="Iniciar Análisis", command=self.start_scraping)
+        self.start_button.grid(row=1, column=1, padx=10, pady=10, sticky="e")
+
+        self.force_refresh_checkbox = ctk.CTkCheckBox(self.input_frame, text="Forzar actualización (ignorar caché local)")
+        self.force_refresh_checkbox.grid(row=2, column=0, padx=10, pady=(0, 10), sticky="w")
+
+        self.since_entry = ctk.CTkEntry(self.input_frame, placeholder_text="Desde (AAAA-MM-DD, opcional)")
+        self.since_entry.grid(row=2, column=2, padx=10, pady=(0, 10), sticky="e")
+
+        self.cancel_button = ctk.CTkButton(self.input_frame, text="Cancelar", command=self.cancel_scraping, state="disabled")
+        self.cancel_button.grid(row=2, column=1, padx=10, pady=(0, 10), sticky="e")
+
+
+        # Frame de Resultados (consola y detalles)
+        self.results_frame = ctk.CTkFrame(self)
+        self.results_frame.grid(row=1, column=0, padx=20, pady=20, sticky="nsew")
+        self.results_frame.grid_rowconfigure(0, weight=0)
+        self.results_frame.grid_rowconfigure(1, weight=1)
+        self.results_frame.grid_columnconfigure(0, weight=1)
+        
+        # Log de consola
+        self.output_log = ctk.CTkTextbox(self.results_frame, width=800, height=100, state="disabled", wrap="word")
+        self.output_log.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="nsew")
+
+        # Frame para los detalles: solo se dibuja la página visible de resultados
+        self.data_display_frame = ctk.CTkFrame(self.results_frame)
+        self.data_display_frame.grid(row=1, column=0, padx=10, pady=(5, 10), sticky="nsew")
+        self.data_display_frame.grid_rowconfigure(1, weight=1)
+        self.data_display_frame.grid_columnconfigure(0, weight=1)
+
+        ctk.CTkLabel(self.data_display_frame, text="Resultados del Análisis:").grid(row=0, column=0, padx=5, pady=(5, 0), sticky="w")
+        self.detailed_results_text = ctk.CTkTextbox(self.data_display_frame, height=250, state="disabled", wrap="word")
+        self.detailed_results_text.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
+
+        self.pager_frame = ctk.CTkFrame(self.data_display_frame, fg_color="transparent")
+        self.pager_frame.grid(row=2, column=0, padx=5, pady=(0, 5), sticky="ew")
+        self.pager_frame.grid_columnconfigure(1, weight=1)
+        self.previous_page_button = ctk.CTkButton(self.pager_frame, text="◀ Anterior", width=100, state="disabled",
+                                                  command=lambda: self.show_results_page(self.results_page - 1))
+        self.previous_page_button.grid(row=0, column=0, padx=5)
+        self.page_label = ctk.CTkLabel(self.pager_frame, text="")
+        self.page_label.grid(row=0, column=1, padx=5)
+        self.next_page_button = ctk.CTkButton(self.pager_frame, text="Siguiente ▶", width=100, state="disabled",
+                                              command=lambda: self.show_results_page(self.results_page + 1))
+        self.next_page_button.grid(row=0, column=2, padx=5)
+        
+        # Botones de Acción (Descargar)
+        self.action_frame = ctk.CTkFrame(self)
+        self.action_frame.grid(row=2, column=0, padx=20, pady=20, sticky="nsew")
+        self.action_frame.grid_columnconfigure((0, 1), weight=1)
+
+        self.download_json_button = ctk.CTkButton(self.action_frame, text="Descargar Resultados (JSON)", command=self.download_json)
+        self.download_json_button.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
+        self.download_json_button.configure(state="disabled")
+
+        self.download_excel_button = ctk.CTkButton(self.action_frame, text="Descargar Resultados (Excel con Tablas)", command=self.download_excel_with_charts)
+        self.download_excel_button.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
+        self.download_excel_button.configure(state="disabled")
+
+        self.scraped_data = []
+        self.results_page = 0
+        # Los hilos de scraping solo encolan mensajes y cuentas; el hilo de Tk los vuelca en _process_queues
+        self.log_queue = queue.SimpleQueue()
+        self.account_queue = queue.SimpleQueue()
+        self.after(LOG_FLUSH_INTERVAL_MS, self._process_queues)
+        self.cancel_event = Event()
+        # Los resultados se vuelcan en NDJSON durante el análisis en lugar de acumularse en memoria.
+        # El archivo "live" recibe cada cuenta al terminar (se muestra y descarga antes del final);
+        # results_path es el definitivo, en el orden de entrada.
+        self.results_path = os.path.join(tempfile.gettempdir(), f"instagram_results_{os.getpid()}.ndjson")
+        self.live_results_path = os.path.join(tempfile.gettempdir(), f"instagram_results_{os.getpid()}_live.ndjson")
+        self.live_writer = None
+        self.selected_posts_count = int(self.posts_count_combobox.get())
+
+    def set_posts_count(self, choice):
+        try:
+            # "Todos" deja la ventana sin límite (útil junto a la fecha "Desde")
+            self.selected_posts_count = None if choice == "Todos" else int(choice)
+            self.update_log(f"Cantidad de posts a obtener configurada a: {choice}")
+        except ValueError:
+            self.update_log("Error: Valor inválido para cantidad de posts. Usando 12 por defecto.")
+            self.selected_posts_count = 12
+            self.posts_count_combobox.set("12")
+
+    def update_log(self, message):
+        """Seguro desde cualquier hilo: el mensaje se muestra en el siguiente volcado del log."""
+        self.log_queue.put(message)
+
+    def _process_queues(self):
+        self._flush_log()
+        self._flush_accounts()
+        self.after(LOG_FLUSH_INTERVAL_MS, self._process_queues)
+
+    def _flush_log(self):
+        messages = []
+        try:
+            while True:
+                messages.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if messages:
+            self.output_log.configure(state="normal")
+            self.output_log.insert("end", "\n".join(messages[-LOG_MAX_LINES:]) + "\n")
+            excess_lines = int(self.output_log.index("end-1c").split(".")[0]) - 1 - LOG_MAX_LINES
+            if excess_lines > 0:
+                self.output_log.delete("1.0", f"{excess_lines + 1}.0")
+            self.output_log.see("end")
+            self.output_log.configure(state="disabled")
+
+    def _flush_accounts(self):
+        """Añade al archivo live las cuentas terminadas desde el último ciclo y redibuja la página visible."""
+        received = 0
+        try:
+            while True:
+                account = self.account_queue.get_nowait()
+                if self.live_writer is not None:
+                    self.live_writer.write(account)
+                    received += 1
+        except queue.Empty:
+            pass
+
+        if received:
+            self.show_results_page(self.results_page)
+            self.download_json_button.configure(state="normal")
+            self.download_excel_button.configure(state="normal")
+
+    def start_scraping(self):
+        usernames_input = self.usernames_entry.get().strip()
+        if not usernames_input:
+            messagebox.showwarning("Entrada Vacía", "Por favor, introduce al menos un nombre de usuario.")
+            return
+
+        # La normalización (URLs, '@', mayúsculas, duplicados) la hace scrape_instagram_profiles
+        usernames_list = split_usernames(usernames_input)
+        if not usernames_list:
+            messagebox.showwarning("Entrada Vacía", "Por favor, introduce al menos un nombre de usuario válido.")
+            return
+
+        since_input = self.since_entry.get().strip()
+        try:
+            since = datetime.strptime(since_input, '%Y-%m-%d') if since_input else None
+        except ValueError:
+            messagebox.showwarning("Fecha inválida", "La fecha \"Desde\" debe tener el formato AAAA-MM-DD.")
+            return
+        if self.posts_count_combobox.get() != str(self.selected_posts_count):
+            # El valor puede haberse escrito a mano en el combobox sin seleccionarlo
+            self.set_posts_count(self.posts_count_combobox.get())
+        if self.selected_posts_count is None and since is None:
+            messagebox.showwarning("Sin límite", "Con \"Todos\" indica también una fecha \"Desde\".")
+            return
+
+        self.output_log.configure(state="normal")
+        self.output_log.delete("1.0", "end")
+        self.output_log.configure(state="disabled")
+        self.cancel_event = Event()
+        if os.path.exists(self.live_results_path):
+            os.remove(self.live_results_path)
+        self.live_writer = NDJSONWriter(self.live_results_path)
+        self.scraped_data = ResultStream(self.live_results_path)
+        self.show_results_page(0)
+        self.start_button.configure(state="disabled", text="Analizando...")
+        self.cancel_button.configure(state="normal", text="Cancelar")
+        self.download_json_button.configure(state="disabled")
+        self.download_excel_button.configure(state="disabled")
+
+        force_refresh = bool(self.force_refresh_checkbox.get())
+        Thread(target=self._run_scraping_thread, args=(usernames_list, self.selected_posts_count, force_refresh, since)).start()
+
+    def cancel_scraping(self):
+        """Deja de programar cuentas nuevas; las peticiones en curso terminan o agotan su timeout."""
+        self.cancel_event.set()
+        self.cancel_button.configure(state="disabled", text="Cancelando...")
+        self.update_log("Cancelando: no se analizarán más cuentas, esperando a las que están en curso...")
+
+    def _run_scraping_thread(self, usernames_list, posts_to_fetch, force_refresh=False, since=None):
+        try:
+            self.update_log("Iniciando análisis de Instagram...")
+            # Una cookie rechazada en el análisis anterior (o corregida en el .env) se vuelve a probar
+            refresh_credentials()
+            results = scrape_instagram_profiles(usernames_list, posts_to_fetch, self._report_progress, force_refresh=force_refresh,
+                                                output_stream=self.results_path, collect_results=False,
+                                                cancel_event=self.cancel_event, since=since)
+            self.after(0, self._display_final_results, results)
+        except Exception as e:
+            error_message = str(e)
+            self.after(0, lambda: messagebox.showerror("Error de Scraping", f"Ocurrió un error inesperado: {error_message}"))
+            self.update_log(f"Error fatal: {error_message}")
+        finally:
+            self.after(0, self._finish_scraping)
+
+    def _finish_scraping(self):
+        # Si el análisis falló, las cuentas ya recibidas siguen disponibles desde el archivo live
+        self._flush_accounts()
+        if self.live_writer is not None:
+            self.live_writer.close()
+            self.live_writer = None
+        has_data = bool(self.scraped_data)
+        self.start_button.configure(state="normal", text="Iniciar Análisis")
+        self.cancel_button.configure(state="disabled", text="Cancelar")
+        self.download_json_button.configure(state="normal" if has_data else "disabled")
+        self.download_excel_button.configure(state="normal" if has_data else "disabled")
+
+    def _report_progress(self, type, message):
+        if type == "log":
+            self.update_log(message)
+        elif type == "account":
+            self.account_queue.put(message.to_dict())
+        elif type == "results":
+            pass
+
+    def _display_final_results(self, results):
+        self._flush_accounts()
+        # Al terminar se sustituye la vista en orden de llegada por el archivo final en orden de entrada
+        self.scraped_data = results
+        if not results:
+            self.update_log("No se pudieron obtener datos para ningún usuario.")
+        self.show_results_page(self.results_page)
+
+    def show_results_page(self, page):
+        """Dibuja solo una página de cuentas; con un ResultStream se leen únicamente esas líneas."""
+        total = len(self.scraped_data) if self.scraped_data else 0
+        page_count = max(1, -(-total // RESULTS_PAGE_SIZE))
+        self.results_page = min(max(page, 0), page_count - 1)
+        start = self.results_page * RESULTS_PAGE_SIZE
+
+        if hasattr(self.scraped_data, "page"):
+            accounts = self.scraped_data.page(start, RESULTS_PAGE_SIZE)
+        else:
+            accounts = (self.scraped_data or [])[start:start + RESULTS_PAGE_SIZE]
+
+        self.detailed_results_text.configure(state="normal")
+        self.detailed_results_text.delete("1.0", "end")
+        self.detailed_results_text.insert("end", "".join(self._format_account(account_as_dict(user)) for user in accounts))
+        self.detailed_results_text.configure(state="disabled")
+
+        self.page_label.configure(text=f"Página {self.results_page + 1} de {page_count} ({total} cuentas)" if total else "")
+        self.previous_page_button.configure(state="normal" if self.results_page > 0 else "disabled")
+        self.next_page_button.configure(state="normal" if self.results_page < page_count - 1 else "disabled")
+
+    def _format_account(self, user):
+        if user.get("Error al obtener perfil") == "Usuario no encontrado":
+            return f"--- {user.get('Nombre de usuario', 'Usuario Desconocido')} ---\nEl usuario ingresado no existe.\n\n"
+
+        detailed_output = f"--- {user.get('Nombre de usuario', 'Usuario Desconocido')} ---\n"
+        detailed_output += f"Nombre completo: {user.get('Nombre completo', 'N/A')}\n"
+        detailed_output += f"Biografía: {user.get('Biografía', 'N/A')}\n"
+        detailed_output += f"País: {user.get('País', 'N/A')}\n"
+        detailed_output += f"cantidad seguidores: {user.get('cantidad seguidores', 'N/A')}\n"
+        detailed_output += f"cantidad seguidos: {user.get('cantidad seguidos', 'N/A')}\n"
+        detailed_output += f"cantidad de publicaciones: {user.get('cantidad de publicaciones', 'N/A')}\n"
+        detailed_output += f"Está verificado ✅: {user.get('Está verificado ✅', 'N/A')}\n"
+        detailed_output += f"¿Es una cuenta profesional?: {user.get('¿Es una cuenta profesional?', 'N/A')}\n"
+
+        posts_for_avg = user.get('Posts para promedio', 'N/A')
+        if posts_for_avg != 'N/A' and posts_for_avg > 0:
+            detailed_output += f"----- Promedio de los últimos {posts_for_avg} posts -----\n"
+        else:
+            detailed_output += f"----- Promedio de posts (No Disponible) -----\n"
+
+        detailed_output += f"Me gusta promedio 👍: {user.get('Me gusta promedio 👍', 'N/A')}\n"
+        detailed_output += f"Comentarios promedio 💬: {user.get('Comentarios promedio 💬', 'N/A')}\n"
+        detailed_output += f"Tasa de interacción 📊: {user.get('Tasa de interacción 📊', 'N/A')}\n"
+
+        if "Error al obtener perfil" in user and user.get("Error al obtener perfil") != "Usuario no encontrado":
+            detailed_output += f"Error al obtener perfil: {user.get('Error al obtener perfil', 'N/A')}\n"
+        if "Error al obtener medios" in user:
+            detailed_output += f"Error al obtener medios: {user.get('Error al obtener medios', 'N/A')}\n"
+
+        return detailed_output + "\n"
+
+    def download_json(self):
+        if not self.scraped_data:
+            messagebox.showwarning("No hay datos", "No hay datos para descargar. Realiza un scraping primero.")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json")],
+            initialfile="instagram_user_data_latest.json"
+        )
+        if file_path:
+            try:
+                write_json(self.scraped_data, file_path)
+                messagebox.showinfo("Descarga Exitosa", f"Datos guardados en:\n{file_path}")
+            except Exception as e:
+                messagebox.showerror("Error al guardar JSON", f"No se pudo guardar el archivo JSON:\n{e}")
+
+    def download_excel_with_charts(self):
+        if not self.scraped_data:
+            messagebox.showwarning("No hay datos", "No hay datos para descargar. Realiza un scraping primero.")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx")],
+            initialfile="instagram_user_data_analysis.xlsx"
+        )
+        if file_path:
+            try:
+                success = export_to_excel_with_pivot_and_charts(self.scraped_data, file_path, include_history=True)
+                if success:
+                    messagebox.showinfo("Descarga Exitosa", f"Datos con tablas guardados en:\n{file_path}")
+                else:
+                    messagebox.showerror("Error al guardar Excel", "No se pudo guardar el archivo Excel. Revisa el log para más detalles.")
+            except Exception as e:
+                messagebox.showerror("Error al guardar Excel", f"Ocurrió un error al intentar guardar el archivo Excel:\n{e}")
+
+def run_gui():
+    app = App()
+    app.mainloop()
+
+if __name__ == "__main__":
+    run_gui()
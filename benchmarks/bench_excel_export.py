@@ -0,0 +1,73 @@
+"""Mide tiempo y pico de memoria (RSS) de la exportación Excel sobre un lote sintético.
+
+Por defecto 2000 cuentas x 50 posts = 100k posts, leídos desde NDJSON como en el modo CLI.
+Uso: python benchmarks/bench_excel_export.py [cuentas] [posts_por_cuenta] [salida.xlsx]
+"""
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from InstagramScrap import (AccountRecord, NDJSONWriter, PostRecord, ResultStream, compute_account_metrics,
+                            export_to_excel_with_pivot_and_charts)
+
+def make_account(index, posts):
+    now = 1_760_000_000
+    items = [{
+        'pk': 3_000_000_000_000_000_000 + index * 1_000 + i,
+        'taken_at': now - i * random.randint(3_600, 300_000),
+        'like_count': random.randint(0, 5_000),
+        'comment_count': random.randint(0, 300),
+        'media_type': random.choice((1, 2, 8)),
+        'caption': {'text': f"Post {i} de la cuenta {index} #benchmark"},
+        'image_versions2': {'candidates': [{'url': f"https://cdn.example.com/{index}/{i}.jpg"}]},
+    } for i in range(posts)]
+    followers = random.randint(1_000, 10_000_000)
+    account = AccountRecord.placeholder(f"cuenta_{index}", {
+        'username': f"cuenta_{index}", 'full_name': f"Cuenta {index}", 'biography': "Bio https://example.com",
+        'edge_followed_by': {'count': followers}, 'edge_follow': {'count': 300},
+        'edge_owner_to_timeline_media': {'count': posts},
+    })
+    account.apply_metrics(compute_account_metrics(items, followers))
+    account.posts = [PostRecord.from_item(item) for item in items]
+    return account
+
+def peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    posts = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    # El directorio temporal guarda el fixture NDJSON (y el .xlsx si no se indica salida): se borra al terminar
+    workdir = tempfile.mkdtemp(prefix='bench_excel_')
+    output = sys.argv[3] if len(sys.argv) > 3 else os.path.join(workdir, 'export.xlsx')
+    fixture = os.path.join(workdir, 'fixture.ndjson')
+
+    try:
+        random.seed(42)
+        with NDJSONWriter(fixture) as writer:
+            for index in range(accounts):
+                writer.write(make_account(index, posts).to_dict())
+
+        # Importa pandas/xlsxwriter antes de medir para no contar su carga en el pico
+        import pandas, xlsxwriter  # noqa: F401
+        baseline = peak_rss_mib()
+        start = time.perf_counter()
+        ok = export_to_excel_with_pivot_and_charts(ResultStream(fixture), output)
+        seconds = time.perf_counter() - start
+        peak = peak_rss_mib()
+
+        print(f"Exportación {'correcta' if ok else 'FALLIDA'}: {accounts} cuentas, {accounts * posts} posts -> {output}")
+        print(f"Tiempo: {seconds:.2f} s")
+        print(f"Pico RSS: {peak:.0f} MiB (+{peak - baseline:.0f} MiB sobre la base de {baseline:.0f} MiB)")
+        print(f"Tamaño del archivo: {os.path.getsize(output) / 2**20:.1f} MiB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
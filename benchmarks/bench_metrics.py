@@ -0,0 +1,70 @@
+"""Compara el cálculo de métricas por cuenta (compute_account_metrics, el que usa el scraper) con el bucle original.
+
+Uso: python benchmarks/bench_metrics.py [cuentas] [posts_por_cuenta]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from InstagramScrap import compute_account_metrics
+
+def make_items(posts):
+    now = 1_760_000_000
+    return [{
+        'pk': 3_000_000_000_000_000_000 + i,
+        'taken_at': now - i * random.randint(3_600, 300_000),
+        'like_count': random.randint(0, 5_000),
+        'comment_count': random.randint(0, 300),
+        'media_type': random.choice((1, 2, 8)),
+        'carousel_media': random.random() < 0.2,
+    } for i in range(posts)]
+
+def legacy_loop(items, followers):
+    """Bucle de fetch_user_media antes del motor de métricas (solo promedios y fecha por post)."""
+    total_likes = 0
+    total_comments = 0
+    media_count_for_averages = 0
+    for item in items:
+        like_count = item.get('like_count', 0)
+        comment_count = item.get('comment_count', 0)
+        timestamp = item.get('taken_at', 0) * 1000
+        if like_count is not None and comment_count is not None:
+            total_likes += like_count
+            total_comments += comment_count
+            media_count_for_averages += 1
+        datetime.fromtimestamp(timestamp / 1000).strftime('%d/%m/%Y') if timestamp else 'N/A'
+    average_likes = round(total_likes / media_count_for_averages, 2) if media_count_for_averages > 0 else 'No Disponible'
+    average_comments = round(total_comments / media_count_for_averages, 2) if media_count_for_averages > 0 else 'No Disponible'
+    if media_count_for_averages > 0 and followers > 0:
+        return round(((average_likes + average_comments) / followers) * 100, 2)
+    return 'No Disponible'
+
+def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    posts = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    random.seed(42)
+    feeds = [make_items(posts) for _ in range(accounts)]
+    followers = [random.randint(1_000, 10_000_000) for _ in range(accounts)]
+
+    start = time.perf_counter()
+    for items, count in zip(feeds, followers):
+        legacy_loop(items, count)
+    legacy_seconds = time.perf_counter() - start
+
+    # Ruta del scraper: cada cuenta se calcula sola al terminar su descarga
+    start = time.perf_counter()
+    for items, count in zip(feeds, followers):
+        compute_account_metrics(items, count)
+    single_seconds = time.perf_counter() - start
+
+    print(f"{accounts} cuentas x {posts} posts")
+    print(f"  bucle original (solo promedios):     {legacy_seconds:.3f} s")
+    print(f"  compute_account_metrics (scraper):   {single_seconds:.3f} s "
+          f"(media, mediana, percentiles, interacción, frecuencia y por tipo)")
+
+if __name__ == "__main__":
+    main()
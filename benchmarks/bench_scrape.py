@@ -0,0 +1,177 @@
+"""Benchmark de scrape_instagram_profiles contra la API simulada (benchmarks/mock_instagram.py), sin red.
+
+Informa cuentas/s, latencia por cuenta (p50/p95), peticiones por endpoint y estado, y pico de memoria.
+Con --baseline compara con un resultado guardado con --json-out y sale con código 1 si el
+rendimiento cae más de --tolerance.
+
+Uso: python benchmarks/bench_scrape.py --accounts 200 --posts 50 --latency-ms 50 --rate-429 0.02
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark del scraper contra la API simulada.")
+    parser.add_argument('--accounts', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=50, help="Posts pedidos por cuenta.")
+    parser.add_argument('--posts-per-user', type=int, default=120, help="Profundidad del feed simulado.")
+    parser.add_argument('--missing-rate', type=float, default=0.05, help="Fracción de usuarios inexistentes (404).")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rps', type=float, default=0, help="Peticiones/s por credencial (0 = sin límite).")
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=None)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--backoff-base', type=float, default=0.05, help="SCRAPER_BACKOFF_BASE_SECONDS del cliente.")
+    parser.add_argument('--media', action='store_true', help="Descarga también los medios (en una carpeta temporal).")
+    parser.add_argument('--media-resolution', default='max')
+    parser.add_argument('--media-rps', type=float, default=0, help="Descargas/s de medios (0 = sin límite).")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json-out', help="Guarda el resultado en JSON.")
+    parser.add_argument('--baseline', help="Resultado JSON previo con el que comparar.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Caída máxima admitida de cuentas/s frente al baseline.")
+    return parser
+
+def start_mock(args):
+    """La API simulada corre en otro proceso para no repartir el GIL ni la memoria con el cliente."""
+    command = [sys.executable, os.path.join(BENCH_DIR, 'mock_instagram.py'), '--port', '0',
+               '--posts-per-user', str(args.posts_per_user), '--latency-ms', str(args.latency_ms),
+               '--jitter-ms', str(args.jitter_ms), '--rate-429', str(args.rate_429),
+               '--malformed-rate', str(args.malformed_rate), '--seed', str(args.seed)]
+    if args.retry_after is not None:
+        command += ['--retry-after', str(args.retry_after)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    api_base = process.stdout.readline().strip().rsplit(' ', 1)[-1]
+    return process, api_base
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run(args, api_base):
+    os.environ.update({
+        'INSTAGRAM_API_BASE': api_base,
+        'SCRAPER_CACHE_DB': '',
+        'SCRAPER_HISTORY_DB': '',
+        'SCRAPER_REQUESTS_PER_SECOND': str(args.rps),
+        'SCRAPER_MAX_WORKERS': str(args.workers),
+        'SCRAPER_BACKOFF_BASE_SECONDS': str(args.backoff_base),
+    })
+    import InstagramScrap as scraper
+
+    # Credencial ficticia: nunca se envían las cookies reales del .env, ni siquiera al servidor local
+    scraper._client = scraper.InstagramClient([("benchmark", "936619743392459", "sessionid=benchmark; csrftoken=benchmark")])
+
+    latencies = []
+    finished = []
+    original_scrape_single = scraper._scrape_single_account
+
+    def timed_scrape_single(*call_args, **call_kwargs):
+        start = time.perf_counter()
+        try:
+            return original_scrape_single(*call_args, **call_kwargs)
+        finally:
+            finished.append(time.perf_counter())
+            latencies.append(finished[-1] - start)
+
+    scraper._scrape_single_account = timed_scrape_single
+
+    missing_every = round(1 / args.missing_rate) if args.missing_rate > 0 else 0
+    usernames = [f"missing_{i}" if missing_every and i % missing_every == missing_every - 1 else f"cuenta_{i}"
+                 for i in range(args.accounts)]
+
+    media_dir = tempfile.mkdtemp(prefix='bench_media_') if args.media else None
+    downloader = scraper.MediaDownloader(media_dir, scraper.parse_media_resolution(args.media_resolution),
+                                         requests_per_second=args.media_rps) if media_dir else None
+
+    baseline_rss = peak_rss_mib()
+    start = time.perf_counter()
+    try:
+        results = scraper.scrape_instagram_profiles(usernames, args.posts, lambda *event: None, media_downloader=downloader)
+        elapsed = time.perf_counter() - start
+        media = downloader.close() if downloader else None
+        media_elapsed = time.perf_counter() - start
+    finally:
+        if media_dir:
+            shutil.rmtree(media_dir, ignore_errors=True)
+
+    return {
+        "accounts": len(results),
+        "seconds": elapsed,
+        "accounts_per_second": len(results) / elapsed if elapsed else 0.0,
+        # Con --media el análisis termina antes de que scrape_instagram_profiles vuelva: la cola de descargas lo frena
+        "scrape_seconds": max(finished, default=start) - start,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_max": max(latencies, default=0.0),
+        "complete": sum(1 for account in results if account.profile_error is None and account.media_error is None),
+        "not_found": sum(1 for account in results if account.profile_error == "Usuario no encontrado"),
+        "failed": sum(1 for account in results if account.media_error is not None
+                      or account.profile_error not in (None, "Usuario no encontrado")),
+        "client": scraper.get_client().connection_stats(),
+        "metrics": scraper.metrics.summary(),
+        "media": dict(media, seconds=media_elapsed, files_per_second=media["downloaded"] / media_elapsed) if media else None,
+        "peak_rss_mib": peak_rss_mib(),
+        "rss_growth_mib": peak_rss_mib() - baseline_rss,
+    }
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    process, api_base = start_mock(args)
+    try:
+        result = run(args, api_base)
+        with urllib.request.urlopen(api_base.rsplit('/api/', 1)[0] + '/__stats') as response:
+            result["server"] = {key: value for key, value in json.load(response).items() if not key.startswith('stats')}
+    finally:
+        process.terminate()
+        process.wait()
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ('json_out', 'baseline', 'tolerance')}
+
+    client = result["client"]
+    print(f"Cuentas: {result['accounts']} ({result['complete']} completas, {result['not_found']} inexistentes, "
+          f"{result['failed']} con error) en {result['seconds']:.2f} s -> {result['accounts_per_second']:.1f} cuentas/s")
+    if result["media"]:
+        print(f"Última cuenta analizada a los {result['scrape_seconds']:.2f} s")
+    print(f"Latencia por cuenta: p50 {result['latency_p50'] * 1000:.0f} ms, p95 {result['latency_p95'] * 1000:.0f} ms, "
+          f"máx {result['latency_max'] * 1000:.0f} ms")
+    print(f"Peticiones del cliente: {client['requests']} ({client['retries']} reintentos, {client['opened']} conexiones abiertas)")
+    print("Respuestas del servidor: " + ", ".join(f"{key}: {value}" for key, value in sorted(result["server"].items())))
+    if result["media"]:
+        media = result["media"]
+        print(f"Medios: {media['downloaded']} archivos ({media['bytes'] / 1024 / 1024:.1f} MiB, {media['failed']} con error) "
+              f"en {media['seconds']:.2f} s -> {media['files_per_second']:.1f} archivos/s")
+    print(f"Pico RSS: {result['peak_rss_mib']:.0f} MiB (+{result['rss_growth_mib']:.0f} MiB durante el análisis)")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        floor = baseline["accounts_per_second"] * (1 - args.tolerance)
+        if result["accounts_per_second"] < floor:
+            print(f"REGRESIÓN: {result['accounts_per_second']:.1f} cuentas/s, por debajo de {floor:.1f} "
+                  f"(baseline {baseline['accounts_per_second']:.1f})")
+            return 1
+        print(f"Sin regresión frente al baseline ({baseline['accounts_per_second']:.1f} cuentas/s).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
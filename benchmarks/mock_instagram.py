@@ -0,0 +1,280 @@
+"""Servidor local que imita los endpoints de la API de Instagram que usa el scraper.
+
+Sirve web_profile_info y feed/user a partir de fixtures grabadas (--fixtures) o generadas de forma
+determinista, con latencia, profundidad de paginación, respuestas 429 y JSON malformado configurables.
+Los posts generados apuntan a imágenes en varias resoluciones que sirve el propio servidor (/media/).
+
+Uso: python benchmarks/mock_instagram.py [--port 8765] [--latency-ms 80] [--rate-429 0.02] ...
+y después INSTAGRAM_API_BASE=http://127.0.0.1:8765/api/v1 python InstagramScrap.py -u cuenta_0,cuenta_1
+
+Fixtures grabadas: <dir>/profiles/<usuario>.json con la respuesta de web_profile_info y
+<dir>/feeds/<user_id>.json con la lista de items del feed (o una respuesta con "items").
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = '/api/v1'
+MISSING_PREFIX = 'missing_'
+BASE_USER_ID = 1_000_000_000
+MEDIA_WIDTHS = (1080, 640, 320)
+CAROUSEL_SIZE = 3
+
+class MockInstagramAPI:
+    """Fixtures, fallos inyectados y contadores de peticiones del servidor simulado."""
+
+    def __init__(self, fixtures_dir=None, posts_per_user=120, latency_ms=50.0, jitter_ms=0.0,
+                 rate_429=0.0, malformed_rate=0.0, retry_after=None, seed=42):
+        self.fixtures_dir = fixtures_dir
+        self.posts_per_user = posts_per_user
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.malformed_rate = malformed_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self._feeds = {}
+        self.stats = {}
+        # serve() lo apunta al propio servidor
+        self.media_base = 'https://cdn.example.com'
+
+    def count(self, endpoint, status):
+        with self._lock:
+            key = f"{endpoint} {status}"
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def roll(self, probability):
+        with self._lock:
+            return self._random.random() < probability
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        time.sleep(max(self.latency_ms + jitter, 0.0) / 1000)
+
+    def _read_fixture(self, *parts):
+        if not self.fixtures_dir:
+            return None
+        path = os.path.join(self.fixtures_dir, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def profile(self, username):
+        """Respuesta de web_profile_info, o None si el usuario no existe."""
+        recorded = self._read_fixture('profiles', f"{username}.json")
+        if recorded is not None:
+            return recorded
+        if self.fixtures_dir or username.startswith(MISSING_PREFIX):
+            return None
+        rng = random.Random(f"{self.seed}:{username}")
+        return {"data": {"user": {
+            "id": str(BASE_USER_ID + zlib.crc32(username.encode('utf-8'))),
+            "username": username,
+            "full_name": username.replace('_', ' ').title(),
+            "biography": f"Cuenta de prueba {username} https://example.com",
+            "edge_followed_by": {"count": rng.randint(1_000, 5_000_000)},
+            "edge_follow": {"count": rng.randint(10, 2_000)},
+            "edge_owner_to_timeline_media": {"count": self.posts_per_user},
+            "is_verified": rng.random() < 0.1,
+            "is_business_account": rng.random() < 0.4,
+            "highlight_reel_count": rng.randint(0, 10),
+        }}}
+
+    def candidates(self, name):
+        return [{"url": f"{self.media_base}/{name}_{width}.jpg", "width": width, "height": width * 5 // 4}
+                for width in MEDIA_WIDTHS]
+
+    @staticmethod
+    def media_body(name, width):
+        """Bytes deterministas de una imagen, de tamaño proporcional a la resolución."""
+        block = hashlib.sha256(f"{name}:{width}".encode('utf-8')).digest()
+        size = width * width * 5 // 4 // 16
+        return (block * (size // len(block) + 1))[:size]
+
+    def feed(self, user_id):
+        with self._lock:
+            items = self._feeds.get(user_id)
+        if items is not None:
+            return items
+        recorded = self._read_fixture('feeds', f"{user_id}.json")
+        if recorded is not None:
+            items = recorded.get('items', []) if isinstance(recorded, dict) else recorded
+        else:
+            rng = random.Random(f"{self.seed}:{user_id}")
+            now = int(time.time())
+            taken_at = now
+            items = []
+            for i in range(self.posts_per_user):
+                taken_at -= rng.randint(3_600, 5 * 86_400)
+                media_type = rng.choice((1, 1, 2, 8))
+                pk = int(user_id) * 10_000 + self.posts_per_user - i
+                items.append({
+                    "pk": pk,
+                    "taken_at": taken_at,
+                    "like_count": rng.randint(0, 50_000),
+                    "comment_count": rng.randint(0, 2_000),
+                    "media_type": media_type,
+                    "caption": {"text": f"Post {i} #benchmark"},
+                    "image_versions2": {"candidates": self.candidates(f"{user_id}_{i}")},
+                    "carousel_media": [
+                        {"pk": pk * 10 + j, "media_type": 1, "image_versions2": {"candidates": self.candidates(f"{user_id}_{i}_{j}")}}
+                        for j in range(CAROUSEL_SIZE)
+                    ] if media_type == 8 else None,
+                })
+        with self._lock:
+            self._feeds[user_id] = items
+        return items
+
+    def feed_page(self, user_id, count, max_id):
+        items = self.feed(user_id)
+        start = int(max_id) if max_id and max_id.isdigit() else 0
+        page = items[start:start + count]
+        end = start + len(page)
+        more = end < len(items)
+        return {"items": page, "num_results": len(page), "more_available": more,
+                "next_max_id": str(end) if more else None, "status": "ok"}
+
+def make_handler(api):
+    class MockInstagramHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Cabeceras y cuerpo van en escrituras separadas: sin esto Nagle + ACK retardado suman ~40 ms por respuesta
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, endpoint, status, body, headers=None):
+            api.count(endpoint, status)
+            payload = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _send_media(self, filename):
+            name, _, width = filename.rsplit('.', 1)[0].rpartition('_')
+            if not name or not width.isdigit():
+                self._send('media', 404, {"status": "fail", "message": "Not found"})
+                return
+            api.delay()
+            if api.roll(api.rate_429):
+                self._send('media', 429, {"status": "fail", "message": "Please wait a few minutes before you try again."})
+                return
+            api.count('media', 200)
+            payload = api.media_body(name, int(width))
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            path = parts.path
+
+            if path == '/__stats':
+                self._send('stats', 200, api.stats)
+                return
+            if path.startswith('/media/'):
+                self._send_media(path[len('/media/'):])
+                return
+            if not path.startswith(API_PREFIX):
+                self._send('unknown', 404, {"status": "fail", "message": "Not found"})
+                return
+
+            segments = [segment for segment in path[len(API_PREFIX):].split('/') if segment]
+            if segments == ['users', 'web_profile_info']:
+                endpoint = 'web_profile_info'
+            elif len(segments) == 3 and segments[:2] == ['feed', 'user']:
+                endpoint = 'feed'
+            else:
+                self._send('unknown', 404, {"status": "fail", "message": "Not found"})
+                return
+
+            api.delay()
+            if api.roll(api.rate_429):
+                headers = {'Retry-After': str(api.retry_after)} if api.retry_after is not None else None
+                self._send(endpoint, 429, {"status": "fail", "message": "Please wait a few minutes before you try again."}, headers)
+                return
+
+            if endpoint == 'web_profile_info':
+                body = api.profile(query.get('username', [''])[0])
+                if body is None:
+                    self._send(endpoint, 404, {"status": "fail", "message": "User not found"})
+                    return
+            else:
+                count = int(query.get('count', ['12'])[0])
+                body = api.feed_page(segments[2], count, query.get('max_id', [None])[0])
+
+            if api.roll(api.malformed_rate):
+                # Respuesta cortada a mitad de transferencia
+                payload = json.dumps(body).encode('utf-8')
+                self._send(endpoint, 200, payload[:max(1, len(payload) // 2)])
+                return
+            self._send(endpoint, 200, body)
+
+    return MockInstagramHandler
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Un cliente que termina con conexiones keep-alive abiertas no es un error del servidor
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def serve(api, host='127.0.0.1', port=0):
+    """Arranca el servidor en un hilo y lo devuelve; la URL base es server.api_base."""
+    server = MockServer((host, port), make_handler(api))
+    server.api_base = f"http://{host}:{server.server_address[1]}{API_PREFIX}"
+    api.media_base = f"http://{host}:{server.server_address[1]}/media"
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="API de Instagram simulada para pruebas y benchmarks sin red.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help="0 elige un puerto libre.")
+    parser.add_argument('--fixtures', help="Carpeta con profiles/<usuario>.json y feeds/<user_id>.json grabados.")
+    parser.add_argument('--posts-per-user', type=int, default=120, help="Profundidad del feed generado.")
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Probabilidad de responder 429.")
+    parser.add_argument('--retry-after', type=float, default=None, help="Valor de Retry-After en los 429.")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="Probabilidad de JSON cortado.")
+    parser.add_argument('--seed', type=int, default=42)
+    return parser
+
+def api_from_args(args):
+    return MockInstagramAPI(args.fixtures, args.posts_per_user, args.latency_ms, args.jitter_ms,
+                            args.rate_429, args.malformed_rate, args.retry_after, args.seed)
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    server = serve(api_from_args(args), args.host, args.port)
+    print(f"Escuchando en {server.api_base}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# Permite importar InstagramScrap desde tests/ sin instalar el proyecto
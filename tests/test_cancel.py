@@ -0,0 +1,69 @@
+"""Cancelar un análisis corta las peticiones pendientes de las cuentas que ya están en curso."""
+import time
+from threading import Event, Timer
+
+import pytest
+
+import InstagramScrap as scraper
+from tests.test_feed_sync import FakeFeed
+
+class ThrottledResponse:
+    status_code = 429
+    headers = {"Retry-After": "30"}
+
+def test_cancel_interrupts_backoff(monkeypatch):
+    client = scraper.InstagramClient([("prueba", "1", "sessionid=x; csrftoken=t")])
+    sent = []
+    monkeypatch.setattr(client.session, "get", lambda url, **kwargs: sent.append(url) or ThrottledResponse())
+    cancel_event = Event()
+    Timer(0.2, cancel_event.set).start()
+
+    start = time.monotonic()
+    with pytest.raises(scraper.RequestCancelled):
+        client.get("http://localhost/feed", cancel_event=cancel_event)
+    # Sin cancelar esperaría los 30 s de Retry-After antes de reintentar
+    assert time.monotonic() - start < 5
+    assert len(sent) == 1
+
+def test_cancel_stops_paging_in_progress(tmp_path, monkeypatch):
+    feed = FakeFeed(100)
+    cancel_event = Event()
+
+    def page(*args, **kwargs):
+        data = feed.page(*args, **kwargs)
+        cancel_event.set()
+        return data
+
+    monkeypatch.setattr(scraper, "_fetch_feed_page", page)
+    monkeypatch.setattr(scraper, "feed_store", scraper.FeedStore(str(tmp_path / "feed.sqlite3"), 500))
+
+    result = scraper._collect_user_media({"id": "1", "username": "cuenta"}, "cuenta", 60, cancel_event=cancel_event)
+    assert result["error"] == "Cancelled"
+    assert feed.requests == 1
+    # Un feed a medias no se guarda para la sincronización incremental
+    assert scraper.feed_store.load("1") is None
+
+def test_keyboard_interrupt_skips_queued_accounts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scraper, "_client", scraper.InstagramClient([("prueba", "1", "sessionid=x; csrftoken=t")]))
+    started = []
+
+    def scrape_account(username, *args):
+        started.append(username)
+        time.sleep(0.02)
+        return scraper.AccountRecord(username=username)
+
+    def callback(type, message):
+        if type == "account" and len(journaled) == 2:
+            raise KeyboardInterrupt
+        if type == "account":
+            journaled.append(message.username)
+
+    journaled = []
+    monkeypatch.setattr(scraper, "_scrape_single_account", scrape_account)
+    with pytest.raises(KeyboardInterrupt):
+        scraper.scrape_instagram_profiles([f"cuenta{i}" for i in range(60)], 12, callback, max_workers=2,
+                                          job_id="interrumpido", record_history=False)
+    # Sin cancelar la cola, el pool analizaría las 60 cuentas antes de propagar el Ctrl-C
+    assert len(started) < 10
+    assert sorted(scraper.CheckpointJournal("interrumpido").load()) == sorted(journaled)
@@ -0,0 +1,38 @@
+"""Línea de comandos contra la API simulada de benchmarks/, en un proceso aparte y sin red."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import mock_instagram as mock
+
+@pytest.fixture(scope="module")
+def api_base():
+    server = mock.serve(mock.MockInstagramAPI(posts_per_user=30, latency_ms=0))
+    yield server.api_base
+    server.shutdown()
+
+def run_cli(api_base, tmp_path, *args, cookie="sessionid=x; csrftoken=t"):
+    env = dict(os.environ, INSTAGRAM_API_BASE=api_base, INSTAGRAM_APP_ID="1", INSTAGRAM_COOKIE=cookie,
+               SCRAPER_CACHE_DB="", SCRAPER_HISTORY_DB="", SCRAPER_REQUESTS_PER_SECOND="0")
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'InstagramScrap.py'), *args], env=env, cwd=tmp_path,
+                          capture_output=True, text=True, timeout=60)
+
+def test_without_output_writes_json_to_stdout(api_base, tmp_path):
+    result = run_cli(api_base, tmp_path, '-u', 'user1,user2', '-p', '5')
+    assert result.returncode == 0, result.stderr
+    accounts = json.loads(result.stdout)
+    assert [account["Nombre de usuario"] for account in accounts] == ["user1", "user2"]
+    assert len(accounts[0]["Últimos X Posts"]) == 5
+
+def test_warnings_do_not_corrupt_stdout(api_base, tmp_path):
+    # Sin csrftoken en la cookie se avisa, pero por stderr: stdout solo lleva el JSON
+    result = run_cli(api_base, tmp_path, '-u', 'user1', '-p', '3', cookie="sessionid=x")
+    assert result.returncode == 0, result.stderr
+    assert "csrftoken" in result.stderr
+    assert json.loads(result.stdout)[0]["Nombre de usuario"] == "user1"
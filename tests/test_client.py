@@ -0,0 +1,56 @@
+"""Cliente HTTP: salud de las credenciales entre análisis y Retry-After desmesurados."""
+import InstagramScrap as scraper
+
+class UnauthorizedResponse:
+    status_code = 401
+    headers = {}
+
+def test_refresh_credentials_retries_rejected_cookie(monkeypatch):
+    credentials = [("principal", "1", "sessionid=x; csrftoken=t")]
+    client = scraper.InstagramClient(credentials)
+    monkeypatch.setattr(client.session, "get", lambda url, **kwargs: UnauthorizedResponse())
+    monkeypatch.setattr(scraper, "_client", client)
+    monkeypatch.setattr(scraper, "load_dotenv", lambda **kwargs: None)
+    monkeypatch.setattr(scraper, "load_credentials", lambda: list(credentials))
+
+    client.get("http://localhost/perfil")
+    assert client.pool.credentials[0].rejected
+
+    # Mismas credenciales: se conserva el cliente, pero la cookie vuelve a probarse
+    scraper.refresh_credentials()
+    assert scraper._client is client and not client.pool.credentials[0].rejected
+
+    # Cookie corregida en el .env: el siguiente análisis crea un cliente con ella
+    credentials[0] = ("principal", "1", "sessionid=y; csrftoken=t")
+    scraper.refresh_credentials()
+    assert scraper._client is None
+
+class OkResponse:
+    status_code = 200
+    headers = {}
+
+class ThrottledResponse:
+    status_code = 429
+
+    def __init__(self, retry_after):
+        self.headers = {"Retry-After": str(retry_after)}
+
+def test_retry_after_above_cap_fails_without_blocking(monkeypatch):
+    client = scraper.InstagramClient([("principal", "1", "sessionid=x; csrftoken=t")], max_retry_after=300)
+    sent = []
+    monkeypatch.setattr(client.session, "get", lambda url, **kwargs: sent.append(url) or ThrottledResponse(3600))
+
+    assert client.get("http://localhost/feed").status_code == 429
+    assert len(sent) == 1
+    # El limitador compartido no queda bloqueado una hora para el resto de peticiones
+    assert client.pool.credentials[0].limiter.wait_time() < 300
+
+def test_retry_after_above_cap_moves_to_another_credential(monkeypatch):
+    client = scraper.InstagramClient([("a", "1", "sessionid=a; csrftoken=t"), ("b", "1", "sessionid=b; csrftoken=t")],
+                                     max_retry_after=300)
+    responses = [ThrottledResponse(3600), OkResponse()]
+    sent = []
+    monkeypatch.setattr(client.session, "get", lambda url, headers, **kwargs: sent.append(headers["Cookie"]) or responses.pop(0))
+
+    assert client.get("http://localhost/feed").status_code == 200
+    assert sent == ["sessionid=a; csrftoken=t", "sessionid=b; csrftoken=t"]
@@ -0,0 +1,23 @@
+"""Parquet se escribe desde los tipos nativos de AccountRecord, sin pasar por las etiquetas."""
+import pytest
+
+import InstagramScrap as scraper
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+def test_columnar_export_from_raw_stream_keeps_native_values(tmp_path):
+    account = scraper.AccountRecord(username="cuenta", followers=1000, is_private=False, engagement_rate=1.0834567,
+                                    avg_likes=None, posts=[scraper.PostRecord(1, 2, 10, 3, None, 1_700_000_000, None, True)])
+    stream_path = str(tmp_path / "resultados.parquet.partial.ndjson")
+    with scraper.NDJSONWriter(stream_path) as writer:
+        writer.write(account.to_raw())
+
+    output = str(tmp_path / "resultados.parquet")
+    assert scraper.export_to_columnar(scraper.ResultStream(stream_path, raw=True), output)
+
+    row, = pq.read_table(output).to_pylist()
+    assert row["engagement_rate_pct"] == 1.0834567
+    assert row["avg_likes"] is None
+    assert row["is_private"] is False
+    post, = pq.read_table(scraper.columnar_posts_path(output)).to_pylist()
+    assert (post["media_type"], post["caption"], post["is_carousel"]) == ("Video", None, True)
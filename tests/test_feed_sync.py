@@ -0,0 +1,65 @@
+"""Sincronización incremental del feed contra FeedStore, sin red (feed simulado en memoria)."""
+from datetime import datetime
+
+import pytest
+
+import InstagramScrap as scraper
+
+BASE_TS = 1_700_000_000
+# Como la API real, cada página trae como mucho este número de posts aunque se pidan más
+SERVER_PAGE_SIZE = 12
+
+class FakeFeed:
+    """Feed de una cuenta, del post más reciente al más antiguo, paginado por índice."""
+
+    def __init__(self, count):
+        self.newest = 0
+        self.requests = 0
+        self.publish(count)
+
+    def publish(self, count):
+        self.newest += count
+
+    def page(self, user_id, username, count, max_id=None, force_refresh=False, cancel_event=None):
+        self.requests += 1
+        start = int(max_id or 0)
+        pks = list(range(self.newest, 0, -1))[start:start + min(count, SERVER_PAGE_SIZE)]
+        end = start + len(pks)
+        return {
+            "items": [{"pk": pk, "taken_at": BASE_TS + pk * 3600, "like_count": pk, "comment_count": 1, "media_type": 1}
+                      for pk in pks],
+            "more_available": end < self.newest,
+            "next_max_id": str(end),
+        }
+
+@pytest.fixture
+def feed(tmp_path, monkeypatch):
+    fake = FakeFeed(30)
+    monkeypatch.setattr(scraper, "_fetch_feed_page", fake.page)
+    monkeypatch.setattr(scraper, "feed_store", scraper.FeedStore(str(tmp_path / "feed.sqlite3"), 500))
+    return fake
+
+def collect(posts_count, since=None):
+    account = scraper._collect_user_media({"id": "1", "username": "cuenta"}, "cuenta", posts_count, since=since)
+    return [post.pk for post in account.posts]
+
+def test_larger_window_after_smaller_one_does_not_skip_posts(feed):
+    assert collect(30) == list(range(30, 0, -1))
+    feed.publish(100)
+    assert collect(10) == list(range(130, 120, -1))
+    assert collect(20) == list(range(130, 110, -1))
+
+def test_since_after_smaller_window_does_not_skip_posts(feed):
+    collect(30)
+    feed.publish(100)
+    collect(10)
+    since = datetime.fromtimestamp(BASE_TS + 101 * 3600)
+    assert collect(None, since=since) == list(range(130, 100, -1))
+
+def test_contiguous_store_is_reused(feed):
+    collect(30)
+    feed.publish(5)
+    requests_before = feed.requests
+    assert collect(30) == list(range(35, 5, -1))
+    # La primera página ya llega a un post guardado: el resto sale de FeedStore
+    assert feed.requests - requests_before == 1
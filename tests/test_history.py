@@ -0,0 +1,35 @@
+"""Consultas de SnapshotStore: el filtro por cuentas y ventana se resuelve con índices, no en Python."""
+import InstagramScrap as scraper
+
+DAY = scraper.SECONDS_PER_DAY
+START = 1_700_000_000
+
+def make_store(tmp_path):
+    store = scraper.SnapshotStore(str(tmp_path / "history.db"))
+    for day in range(5):
+        run_id = store.start_run(START + day * DAY)
+        for index, username in enumerate(("ana", "bea", "carla")):
+            account = scraper.AccountRecord(username=username, followers=1000 * (index + 1) + 10 * day * (index + 1))
+            store.record(run_id, account, ts=START + day * DAY)
+        store.finish_run(run_id)
+    return store
+
+def plan(store, sql, params):
+    return " ".join(row[3] for row in store._connection().execute("EXPLAIN QUERY PLAN " + sql, params))
+
+def test_trends_and_history_filter_in_sql(tmp_path):
+    store = make_store(tmp_path)
+    trends = store.trends("followers", since=START + 2 * DAY, usernames=["carla", "ana"])
+    assert [(trend["username"], trend["snapshots"], trend["slope_per_day"]) for trend in trends] == [
+        ("carla", 3, 30), ("ana", 3, 10)]
+
+    rows = store.history_rows(["bea"])
+    assert [row["followers"] for row in rows] == [2000, 2020, 2040, 2060, 2080]
+    assert [row["followers_delta"] for row in rows] == [None, 20, 20, 20, 20]
+
+    username_sql, username_params = store._username_filter(["ana"])
+    query = plan(store, f"SELECT * FROM account_snapshots WHERE ts >= ?{username_sql}", (0, *username_params))
+    assert "SEARCH account_snapshots USING PRIMARY KEY (username=? AND ts>?)" in query
+    query = plan(store, "SELECT COUNT(*) FROM account_snapshots WHERE run_id = ?", (1,))
+    assert "SCAN account_snapshots" not in query and "idx_account_snapshots_run" in query
+    store.close()
@@ -0,0 +1,51 @@
+"""La cola de descargas de medios: el análisis no espera y la memoria no crece con el retraso."""
+import sqlite3
+import time
+from threading import Event
+
+import InstagramScrap as scraper
+
+def account(username, first_pk, posts):
+    return scraper.AccountRecord(username=username, posts=[
+        scraper.PostRecord(pk=pk, media_type=1, likes=0, comments=0, caption=None, taken_at=0, media_url=None,
+                           is_carousel=False, media=((f"m{pk}", ({"url": f"http://cdn/{pk}.jpg", "width": 10, "height": 10},)),))
+        for pk in range(first_pk, first_pk + posts)
+    ])
+
+def pending_rows(directory):
+    with sqlite3.connect(str(directory / "index.sqlite3")) as conn:
+        return conn.execute("SELECT COUNT(*) FROM pending_downloads").fetchone()[0]
+
+def test_submit_does_not_wait_for_a_full_queue(tmp_path, monkeypatch):
+    release = Event()
+
+    def slow_download(self, key, media_id, username, post_pk, candidate):
+        release.wait()
+        self._count("downloaded")
+
+    monkeypatch.setattr(scraper.MediaDownloader, "_download", slow_download)
+    downloader = scraper.MediaDownloader(str(tmp_path), workers=1, queue_size=2)
+    try:
+        start = time.monotonic()
+        for i in range(10):
+            assert downloader.submit(account(f"cuenta{i}", i * 10, 10)) == 10
+        assert time.monotonic() - start < 5
+        # Solo la cola acotada (y la descarga en curso) está en memoria; el resto espera en el índice
+        assert downloader._queue.qsize() <= 2
+        assert pending_rows(tmp_path) == 100
+        # Volver a entregar los mismos medios no los duplica
+        assert downloader.submit(account("cuenta0", 0, 10)) == 0
+    finally:
+        release.set()
+        stats = downloader.close()
+    assert stats["queued"] == stats["downloaded"] == 100
+    assert pending_rows(tmp_path) == 0
+
+def test_every_unusable_media_counts_as_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper.MediaDownloader, "_download", lambda self, *job: self._count("downloaded"))
+    broken = account("rota", 1, 3)
+    for post in broken.posts:
+        post.media = ((f"m{post.pk}", ()),)  # sin candidatos
+    with scraper.MediaDownloader(str(tmp_path), workers=1) as downloader:
+        assert downloader.submit(broken) == 0
+    assert downloader.stats["failed"] == 3
@@ -0,0 +1,45 @@
+"""Métricas de una cuenta calculadas desde sus posts compactados."""
+import random
+
+import pytest
+
+import InstagramScrap as scraper
+
+WEEK = 7 * 24 * 3600
+
+def item(likes, comments, media_type, taken_at):
+    return {"pk": taken_at, "like_count": likes, "comment_count": comments, "media_type": media_type, "taken_at": taken_at}
+
+def test_account_metrics():
+    items = [item(40, 4, 8, 4 * WEEK), item(30, 3, 2, 3 * WEEK), item(20, 2, 1, 2 * WEEK), item(10, 1, 1, 1 * WEEK),
+             # Sin likes visibles: no cuenta para ninguna métrica
+             item(None, 9, 1, 5 * WEEK)]
+    metrics = scraper.compute_account_metrics(items, 1000)
+
+    assert metrics["posts"] == 4
+    assert metrics["likes_mean"] == 25 and metrics["comments_mean"] == 2.5
+    assert metrics["engagement_rate"] == pytest.approx(2.75)
+    assert metrics["likes_quantiles"] == pytest.approx({0.25: 17.5, 0.5: 25, 0.75: 32.5, 0.9: 37})
+    assert metrics["posts_per_week"] == pytest.approx(1.0)
+    assert metrics["by_media_type"] == {
+        "Foto": {"posts": 2, "likes_mean": 15, "comments_mean": 1.5},
+        "Video": {"posts": 1, "likes_mean": 30, "comments_mean": 3},
+        "Otro": {"posts": 1, "likes_mean": 40, "comments_mean": 4},
+    }
+
+@pytest.mark.parametrize("followers", [0, None, "No Disponible"])
+def test_without_posts_or_followers_metrics_are_missing(followers):
+    metrics = scraper.compute_account_metrics([], followers)
+    assert metrics["posts"] == 0
+    assert metrics["likes_mean"] is None and metrics["engagement_rate"] is None and metrics["posts_per_week"] is None
+    assert metrics["likes_quantiles"][0.5] is None
+    assert metrics["by_media_type"] == {}
+    assert scraper.compute_account_metrics([item(10, 1, 1, WEEK)], followers)["engagement_rate"] is None
+
+def test_quantiles_match_linear_interpolation():
+    np = pytest.importorskip("numpy")
+    rng = random.Random(7)
+    for size in (1, 2, 5, 12, 50):
+        values = sorted(rng.randint(0, 5_000) for _ in range(size))
+        for q in scraper.METRIC_QUANTILES:
+            assert scraper._quantile(values, q) == pytest.approx(float(np.quantile(values, q)))
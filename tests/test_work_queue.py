@@ -0,0 +1,123 @@
+"""run_worker solo depende de la interfaz WorkQueue: cualquier broker que la implemente sirve."""
+import time
+
+import InstagramScrap as scraper
+
+class MemoryWorkQueue(scraper.WorkQueue):
+    """Broker mínimo en memoria, como lo sería uno de red."""
+
+    lease_seconds = 60
+
+    def __init__(self, usernames):
+        self.pending = list(usernames)
+        self.leased = {}
+        self.done = {}
+
+    def claim(self, worker_id, count):
+        claimed, self.pending = self.pending[:count], self.pending[count:]
+        self.leased.update((username, worker_id) for username in claimed)
+        return claimed
+
+    def heartbeat(self, worker_id):
+        return sum(owner == worker_id for owner in self.leased.values())
+
+    def finish(self, account_info, worker_id):
+        if self.leased.get(account_info.username) != worker_id:
+            return False
+        del self.leased[account_info.username]
+        self.done[account_info.username] = account_info
+        return True
+
+    def release(self, worker_id):
+        released = [username for username, owner in self.leased.items() if owner == worker_id]
+        for username in released:
+            del self.leased[username]
+        self.pending.extend(released)
+        return len(released)
+
+    def status(self):
+        return {"pending": len(self.pending), "leased": len(self.leased), "done": len(self.done), "failed": 0,
+                "expired_leases": 0}
+
+def test_run_worker_with_custom_broker(monkeypatch):
+    def fake_scrape(usernames, posts_to_fetch, callback, **kwargs):
+        for username in usernames:
+            callback("account", scraper.AccountRecord(username=username))
+
+    monkeypatch.setattr(scraper, "scrape_instagram_profiles", fake_scrape)
+    queue = MemoryWorkQueue([f"cuenta{i}" for i in range(10)])
+
+    finished = scraper.run_worker(queue, 12, lambda *args: None, worker_id="w1", batch_size=3)
+
+    assert finished == 10
+    assert queue.is_drained()
+    assert sorted(queue.done) == sorted(f"cuenta{i}" for i in range(10))
+
+def test_run_worker_retries_failed_heartbeats(monkeypatch):
+    class FlakyQueue(MemoryWorkQueue):
+        lease_seconds = 0.03
+        heartbeats = 0
+
+        def heartbeat(self, worker_id):
+            self.heartbeats += 1
+            if self.heartbeats == 1:
+                raise OSError("broker caído")
+            return super().heartbeat(worker_id)
+
+    def slow_scrape(usernames, posts_to_fetch, callback, **kwargs):
+        time.sleep(0.2)
+        for username in usernames:
+            callback("account", scraper.AccountRecord(username=username))
+
+    monkeypatch.setattr(scraper, "scrape_instagram_profiles", slow_scrape)
+    queue = FlakyQueue(["cuenta"])
+    logs = []
+
+    assert scraper.run_worker(queue, 12, lambda type, message: logs.append(message), worker_id="w1") == 1
+    assert queue.heartbeats > 1
+    assert any("broker caído" in str(message) for message in logs)
+
+# --- SQLiteWorkQueue ---
+
+def test_sqlite_expired_lease_is_reclaimed_and_stale_finish_rejected(tmp_path):
+    queue = scraper.SQLiteWorkQueue(str(tmp_path / "jobs.db"), lease_seconds=60)
+    queue.enqueue(["ana", "bea"])
+    assert queue.claim("w1", 2) == ["ana", "bea"]
+    assert queue.claim("w2", 2) == []
+
+    # w1 deja de renovar: pasado el lease las cuentas vuelven a la cola y las recupera w2
+    assert queue.reclaim_expired(now=time.time() + 61) == 2
+    assert queue.claim("w2", 2) == ["ana", "bea"]
+
+    assert not queue.finish(scraper.AccountRecord(username="ana"), "w1")
+    assert queue.status()["leased"] == 2
+    assert queue.finish(scraper.AccountRecord(username="ana"), "w2")
+    assert not queue.finish(scraper.AccountRecord(username="ana"), "w2")
+    assert queue.status() == {"pending": 0, "leased": 1, "done": 1, "failed": 0, "expired_leases": 0}
+    queue.close()
+
+def test_sqlite_expired_lease_fails_after_max_attempts(tmp_path):
+    queue = scraper.SQLiteWorkQueue(str(tmp_path / "jobs.db"), lease_seconds=60, max_attempts=1)
+    queue.enqueue(["ana"])
+    queue.claim("w1", 1)
+    assert queue.reclaim_expired(now=time.time() + 61) == 1
+    assert queue.claim("w2", 1) == []
+    assert queue.status()["failed"] == 1
+    queue.close()
+
+def test_sqlite_heartbeat_extends_only_own_leases(tmp_path):
+    queue = scraper.SQLiteWorkQueue(str(tmp_path / "jobs.db"), lease_seconds=60)
+    queue.enqueue(["ana", "bea"])
+    queue.claim("w1", 1)
+    queue.claim("w2", 1)
+
+    def expires():
+        return dict(queue._conn.execute("SELECT username, lease_expires FROM jobs").fetchall())
+
+    before = expires()
+    time.sleep(0.01)
+    assert queue.heartbeat("w1") == 1
+    after = expires()
+    assert after["ana"] > before["ana"] and after["bea"] == before["bea"]
+    assert queue.heartbeat("w3") == 0
+    queue.close()